@@ -1,19 +1,25 @@
 import argparse
 import datetime
+import functools
+import importlib
 import json
 import os
 import sys
-from typing import Any, Dict
+import time
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
-import yaml
-from dotenv import load_dotenv
-from mcp import StdioServerParameters
+from daemon import DAEMON_URL_ENV, DEFAULT_DAEMON_URL, daemon_health, outside_workspace, submit_job, within
+from defaults import (CACHE_MODES, DEFAULT_CACHE_DIR, DEFAULT_CALLS_PER_LEVEL, DEFAULT_CONCURRENCY,
+                      DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_REPAIRS, DEFAULT_MAX_RETRIES, DEFAULT_MAX_SIZE_MB,
+                      DEFAULT_MODEL, DEFAULT_RESULTS_DB, DEFAULT_RUNS_DIR, DEFAULT_SHARD_SIZE,
+                      DEFAULT_STRESS_ARGUMENTS, DEFAULT_TRACE_FILE, MODEL_ROLES)
 
-# Import modes from the new package
-from modes.base import EvaluationMode
-from modes.interview import InterviewMode
-from modes.introspection import IntrospectionMode
-from smolagents import OpenAIServerModel, ToolCollection
+# smolagents, mcp and the modes are imported where they are used, so that --help, argument errors
+# and the render subcommand do not pay for importing them
+if TYPE_CHECKING:
+    from event_log import RunLog
+    from modes.base import EvaluationMode
 
 # --- Utility Functions (Remain unchanged) ---
 
@@ -26,6 +32,7 @@ def get_server_parameters(server_type, server_params):
                 raise ValueError("No command specified for stdio server")
             command = parts[0]
             args = parts[1:] if len(parts) > 1 else []
+            from mcp import StdioServerParameters
             return StdioServerParameters(
                 command=command,
                 args=args,
@@ -41,9 +48,22 @@ def get_server_parameters(server_type, server_params):
         print(f"Error configuring server parameters: {str(e)}", file=sys.stderr)
         sys.exit(1)
 
-def save_report(result: Dict[str, Any], output_format: str, mode: str, timestamp: str):
-    """Save the evaluation report in the specified format."""
-    report_prefix = f"{mode}_report"
+@functools.lru_cache(maxsize=None)
+def load_template(template_path: str) -> str:
+    """Read an HTML report template, once per process."""
+    with open(template_path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def save_report(result: Dict[str, Any], output_format: str, mode: str, timestamp: str, output_dir: str = ".",
+                save_json: bool = True, server: Optional[str] = None, results_db: Optional[str] = None):
+    """Save the evaluation report in the specified format.
+
+    save_json=False skips the raw JSON copy written next to an HTML report (e.g. when re-rendering one).
+    results_db (path of a SQLite results database) also indexes the report's scores under the
+    server, mode, model and timestamp, for cross-run queries (see results_store.py).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    report_prefix = os.path.join(output_dir, f"{mode}_report")
     # Look for templates inside mvp/modes/templates
     template_file = f"template_{mode}.html"
     # Construct the path relative to the current file's directory
@@ -61,6 +81,7 @@ def save_report(result: Dict[str, Any], output_format: str, mode: str, timestamp
         print(f"Report saved as {output_file_json}")
     
     elif output_format == "yaml":
+        import yaml
         output_file_yaml = f"{report_prefix}_{timestamp}.yaml"
         with open(output_file_yaml, "w", encoding="utf-8") as f:
             yaml.dump(result, f, default_flow_style=False, allow_unicode=True)
@@ -68,8 +89,7 @@ def save_report(result: Dict[str, Any], output_format: str, mode: str, timestamp
     
     elif output_format == "html":
         try:
-            with open(template_path, "r", encoding="utf-8") as f:
-                template_content = f.read()
+            template_content = load_template(template_path)
         except FileNotFoundError:
             print(f"Error: Template file not found at {template_path}", file=sys.stderr)
             print("Generating JSON output instead.")
@@ -140,20 +160,211 @@ document.addEventListener("DOMContentLoaded", function() {{
         print(f"HTML report saved as {output_file_html}")
 
         # Save the raw JSON data as well
-        with open(output_file_json, "w", encoding="utf-8") as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
-        print(f"Raw data also saved as {output_file_json}")
+        if save_json:
+            with open(output_file_json, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+            print(f"Raw data also saved as {output_file_json}")
+
+    elif output_format == "html-offline":
+        from offline_report import TEMPLATE_FILE, build_offline_html, describe_build
+        started = time.perf_counter()
+        template = load_template(os.path.join(os.path.dirname(__file__), "modes", "templates", TEMPLATE_FILE))
+        html_content, stats = build_offline_html(template, result, mode)
+        with open(output_file_html, "w", encoding="utf-8") as f:
+            f.write(html_content)
+        print(f"Offline HTML report saved as {output_file_html} ({describe_build(stats, time.perf_counter() - started)})")
+
+        if save_json:
+            with open(output_file_json, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+            print(f"Raw data also saved as {output_file_json}")
+
+    if results_db and isinstance(result, dict):
+        from results_store import ResultsStore
+        report = os.path.abspath(output_file_json) if output_format != "console" and os.path.exists(output_file_json) else None
+        with ResultsStore(results_db) as store:
+            run_id = store.add_run(result, mode, timestamp, server=server, report=report)
+        print(f"Scores indexed in {results_db} (run {run_id})")
+
+
+# --- Evaluation Helpers ---
+
+# Registry of available evaluation modes, keyed by their CLI name; classes are imported on first use
+MODES = {
+    "introspect": ("modes.introspection", "IntrospectionMode"),
+    "interview": ("modes.interview", "InterviewMode"),
+    "stress": ("modes.stress", "StressMode"),
+}
+
+# Constructor options of the stress mode, set by the load testing arguments
+STRESS_OPTIONS = ("concurrency", "calls_per_level", "rate", "arguments_file")
+
+# Models configuration (see model_roles.create_models), set by the model and rate limit arguments
+MODEL_OPTIONS = ("model", "api_base", "role_models", "rpm", "tpm", "max_retries")
+
+# Mode options that must be at least 1, checked when parsing arguments and batch manifests
+POSITIVE_OPTIONS = ("max_workers", "shard_size")
+
+def positive_int(value: str) -> int:
+    """argparse type of options that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+def create_mode(mode: str, **options) -> "EvaluationMode":
+    """Instantiate the evaluation mode registered under the given name."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}'")
+    module_name, class_name = MODES[mode]
+    return getattr(importlib.import_module(module_name), class_name)(**options)
+
+def attach_metadata(result: Any, key: str, value: Any) -> Any:
+    """Attach harness-side metadata (cache statistics, timings, ...) to an evaluation result."""
+    if isinstance(result, str):
+        # Agents may hand back the report as a JSON string
+        try:
+            result = json.loads(result)
+        except json.JSONDecodeError:
+            return result
+    if isinstance(result, dict):
+        result.setdefault("metadata", {})[key] = value
+    return result
+
+def run_evaluation(mode: str, server_parameters, api_key: str, llm_cache: Optional[Dict[str, Any]] = None,
+                   record_session: Optional[str] = None, replay_session: Optional[str] = None,
+                   replay_latency: bool = False, mode_options: Optional[Dict[str, Any]] = None,
+                   server_pool=None, previous_report: Optional[str] = None,
+                   run_log: Optional["RunLog"] = None, profile: Optional[Dict[str, Any]] = None,
+                   models: Optional[Dict[str, Any]] = None) -> Any:
+    """Run a single evaluation mode against a single MCP server and return the result.
+
+    llm_cache optionally enables the response cache, e.g.
+    {"mode": "read-through", "dir": ".llm_cache", "max_size_mb": 512, "max_age_days": 30}.
+    record_session/replay_session capture the MCP traffic to, or serve it from, a session file.
+    mode_options are passed to the evaluation mode's constructor (e.g. max_workers).
+    server_pool (a daemon.ServerPool) leases a warm server session instead of starting the server.
+    previous_report (path to a JSON report of the same mode) switches to incremental re-evaluation:
+    only tools added or changed since that report are re-tested.
+    run_log (an event_log.RunLog) logs every model and tool call, and serves those of an earlier attempt.
+    profile enables OpenTelemetry tracing and adds a performance block to the result, e.g.
+    {"trace_file": "traces.jsonl", "otlp_endpoint": None}.
+    models configures the model of every role and the rate limits of their endpoints, e.g.
+    {"model": "gpt-4o", "roles": {"candidate": {"model_id": "gpt-4o-mini"}}, "rpm": 500} (see model_roles.py).
+    """
+    from fingerprint import diff_fingerprints, fingerprint_tools, load_previous_report
+    from llm_cache import CachedModel, LLMCache
+    from mcp_session import open_tool_collection
+    from model_roles import create_models, describe_models
+    from profiling import Profiler
+    from scheduler import SchedulerStats
+
+    scheduler_stats = SchedulerStats()
+    roles = create_models(api_key, models, scheduler_stats)
+    cache = None
+    if llm_cache and llm_cache.get("mode"):
+        cache = LLMCache(
+            directory=llm_cache.get("dir", DEFAULT_CACHE_DIR),
+            max_size_mb=llm_cache.get("max_size_mb", DEFAULT_MAX_SIZE_MB),
+            max_age_days=llm_cache.get("max_age_days", DEFAULT_MAX_AGE_DAYS),
+        )
+        roles = roles.map(lambda model: CachedModel(model, cache, mode=llm_cache["mode"]))
+    if run_log is not None:
+        roles = roles.map(run_log.wrap_model)
+    eval_mode = create_mode(mode, **(mode_options or {}))
+    previous = load_previous_report(previous_report, mode) if previous_report else None
+
+    # Run the selected evaluation mode within the ToolCollection context
+    if server_pool is not None and not (record_session or replay_session):
+        tools_context = server_pool.lease(server_parameters)
+    else:
+        tools_context = open_tool_collection(server_parameters, record_session=record_session,
+                                             replay_session=replay_session, replay_latency=replay_latency)
+    # The profiled span covers server startup as well as the evaluation itself
+    profile_context = (Profiler.get().profile_run(f"evaluate {mode}", trace_file=profile.get("trace_file"),
+                                                  otlp_endpoint=profile.get("otlp_endpoint"),
+                                                  attributes={"evaluation.mode": mode})
+                       if profile else nullcontext())
+    with profile_context as run_profile, tools_context as tool_collection:
+        # Modes measuring the server (stress) need every call to reach it, not the log of an earlier attempt
+        if run_log is not None and getattr(eval_mode, "log_tool_calls", True):
+            tool_collection = run_log.wrap_tools(tool_collection)
+        fingerprints = fingerprint_tools(tool_collection.tools, mode)
+        if previous is not None:
+            changes = diff_fingerprints(previous["metadata"]["tool_fingerprints"]["tools"], fingerprints["tools"])
+            print(f"Incremental run against {previous_report}: {len(changes['added'])} added, "
+                  f"{len(changes['changed'])} changed, {len(changes['removed'])} removed, "
+                  f"{len(changes['unchanged'])} unchanged tools")
+            result = eval_mode.run_incremental(roles, tool_collection, previous, changes)
+            result = attach_metadata(result, "incremental", {"previous_report": previous_report})
+        else:
+            result = eval_mode.run(roles, tool_collection)
+    # Stored with the report so the next run can tell which tools changed
+    result = attach_metadata(result, "tool_fingerprints", fingerprints)
+    # Runs are indexed under the default model, the models of the roles are listed next to it
+    result = attach_metadata(result, "model", (models or {}).get("model") or DEFAULT_MODEL)
+    result = attach_metadata(result, "models", describe_models(models))
+
+    if run_profile is not None and isinstance(result, dict):
+        result["performance"] = run_profile.summary(result.get("metadata", {}).get("phase_timings"))
+        print(f"Profile spans exported to {run_profile.exported_to}")
+    if cache is not None and result:
+        result = attach_metadata(result, "llm_cache", {"mode": llm_cache["mode"], **cache.summary()})
+    if run_log is not None:
+        result = attach_metadata(result, "run", run_log.summary())
+    # Cache hits and calls replayed from the event log never reach the scheduler
+    result = attach_metadata(result, "scheduler", {
+        "limits": {"rpm": (models or {}).get("rpm"), "tpm": (models or {}).get("tpm")},
+        **scheduler_stats.summary(),
+    })
+    return result
 
 # --- Main Execution (Refactored) ---
 
-if __name__ == "__main__":
+# Subcommands dispatched before the regular single-server argument parsing
+SUBCOMMANDS = ("batch", "daemon", "render", "query")
+
+def main(argv=None):
+    from dotenv import load_dotenv
     load_dotenv()
+    argv = sys.argv[1:] if argv is None else argv
+
+    if argv and argv[0] in SUBCOMMANDS:
+        if argv[0] == "batch":
+            from batch import main as batch_main
+            return batch_main(argv[1:])
+        if argv[0] == "daemon":
+            from daemon import main as daemon_main
+            return daemon_main(argv[1:])
+        if argv[0] == "render":
+            from render import main as render_main
+            return render_main(argv[1:])
+        if argv[0] == "query":
+            from results_store import main as query_main
+            return query_main(argv[1:])
 
-    parser = argparse.ArgumentParser(description="MCP Agent Evaluation Tool")
-    parser.add_argument("--mode", type=str, choices=["introspect", "interview"], required=True,
-                        help="Evaluation mode: introspect (agent evaluates itself) or interview (interviewer evaluates agent)")
-    parser.add_argument("--output", type=str, choices=["console", "json", "yaml", "html"], 
-                        default="console", help="Output format (default: console)")
+    parser = argparse.ArgumentParser(
+        description="MCP Agent Evaluation Tool",
+        epilog="Use 'batch MANIFEST' to evaluate many servers from a manifest file, "
+               "'daemon' to start an evaluator daemon that keeps MCP servers warm, "
+               "'render REPORT.json' to re-render saved reports as HTML or YAML, "
+               "or 'query {stats,trend,leaderboard}' to aggregate scores across runs.",
+    )
+    parser.add_argument("--mode", type=str, choices=list(MODES),
+                        help="Evaluation mode: introspect (agent evaluates itself), interview (interviewer evaluates agent) "
+                             "or stress (load-test the server's tools)")
+    parser.add_argument("--output", type=str, choices=["console", "json", "yaml", "html", "html-offline"], 
+                        default="console",
+                        help="Output format (default: console). html-offline is a self-contained HTML report that "
+                             "loads nothing from the network and stays fast for large reports")
+    parser.add_argument("--max-workers", type=positive_int,
+                        help="Number of evaluation tasks (introspect) or sub-interviews (interview) run concurrently (default: 4)")
+    parser.add_argument("--shard-size", type=positive_int,
+                        help="Maximum number of tools per shard; servers with more tools are split into shards of "
+                             f"similar tools, evaluated separately and merged (default: {DEFAULT_SHARD_SIZE})")
+    parser.add_argument("--max-repairs", type=int,
+                        help="Times a report section that fails validation has its failing fields asked for again "
+                             f"before the section fails; 0 disables repairs (default: {DEFAULT_MAX_REPAIRS})")
     
     server_group = parser.add_argument_group("MCP Server Configuration")
     server_group.add_argument("--server-type", type=str, choices=["stdio", "sse"],
@@ -163,10 +374,118 @@ if __name__ == "__main__":
                             "For stdio: command and args (e.g., 'uvx mcp-server-time --local-timezone=UTC'). "
                             "For sse: endpoint URL.")
     
-    args = parser.parse_args()
+    session_group = server_group.add_mutually_exclusive_group()
+    session_group.add_argument("--record-session", type=str, metavar="PATH",
+                       help="Record the MCP handshake, tool list and every tool call to a session file "
+                            "(compressed when PATH ends with .gz)")
+    session_group.add_argument("--replay-session", type=str, metavar="PATH",
+                       help="Serve tools from a recorded session file instead of starting the MCP server")
+    server_group.add_argument("--replay-latency", action="store_true",
+                       help="When replaying, sleep for the originally recorded tool latencies")
+
+    parser.add_argument("--incremental", type=str, metavar="PREVIOUS_REPORT",
+                        help="Re-evaluate only tools added or changed since a previous JSON report of the same mode, "
+                             "carrying forward everything else")
+
+    run_group = parser.add_argument_group("Event Log and Resume")
+    run_group.add_argument("--run-id", type=str,
+                       help="Identifier of this run, names its event log (default: timestamp plus a random suffix)")
+    run_group.add_argument("--resume", type=str, metavar="RUN_ID",
+                       help="Resume a failed or interrupted run from its event log, with the options it was started with")
+    run_group.add_argument("--runs-dir", type=str, default=DEFAULT_RUNS_DIR,
+                       help=f"Directory of the JSONL event logs (default: {DEFAULT_RUNS_DIR})")
+
+    profile_group = parser.add_argument_group("Profiling")
+    profile_group.add_argument("--profile", action="store_true",
+                       help="Trace every agent step, model call and tool call with OpenTelemetry and add a "
+                            "performance block to the report")
+    profile_group.add_argument("--trace-file", type=str, default=DEFAULT_TRACE_FILE,
+                       help=f"File the spans are appended to as JSON lines (default: {DEFAULT_TRACE_FILE})")
+    profile_group.add_argument("--otlp-endpoint", type=str,
+                       help="Send the spans to this OTLP/HTTP endpoint instead of the trace file "
+                            "(e.g. http://localhost:4318/v1/traces)")
+
+    stress_group = parser.add_argument_group("Load Testing (--mode stress)")
+    stress_group.add_argument("--concurrency", type=int, nargs="+", metavar="N",
+                       help="Concurrency levels every tool is load-tested at "
+                            f"(default: {' '.join(map(str, DEFAULT_CONCURRENCY))})")
+    stress_group.add_argument("--calls-per-level", type=int,
+                       help=f"Calls made to every tool at each concurrency level (default: {DEFAULT_CALLS_PER_LEVEL})")
+    stress_group.add_argument("--rate", type=float,
+                       help="Pace the calls to every tool to this many per second (default: as fast as possible)")
+    stress_group.add_argument("--stress-arguments", type=str, dest="arguments_file", metavar="PATH",
+                       help="File caching the tool calls derived by the LLM, keyed by tool schema "
+                            f"(default: {DEFAULT_STRESS_ARGUMENTS})")
+
+    models_group = parser.add_argument_group("Models and Rate Limits")
+    models_group.add_argument("--model", type=str,
+                       help=f"Model of every role without one of its own (default: {DEFAULT_MODEL})")
+    models_group.add_argument("--api-base", type=str, metavar="URL",
+                       help="OpenAI-compatible endpoint of that model, e.g. a local server at http://localhost:8000/v1 "
+                            "(default: OpenAI, or OPENAI_BASE_URL)")
+    models_group.add_argument("--role-model", type=str, action="append", dest="role_models",
+                       metavar="ROLE=MODEL_ID[@URL]",
+                       help=f"Model (and endpoint) of one role, repeatable; roles: {', '.join(MODEL_ROLES)}")
+    models_group.add_argument("--rpm", type=float,
+                       help="Requests per minute allowed to each endpoint, shared by all roles (default: unlimited)")
+    models_group.add_argument("--tpm", type=float,
+                       help="Tokens per minute allowed to each endpoint, shared by all roles (default: unlimited)")
+    models_group.add_argument("--max-retries", type=int,
+                       help="Retries of a call rejected with 429 or a transient server error, after a jittered "
+                            f"exponential backoff (default: {DEFAULT_MAX_RETRIES})")
+
+    results_group = parser.add_argument_group("Results Database")
+    results_group.add_argument("--results-db", type=str, default=DEFAULT_RESULTS_DB,
+                       help=f"SQLite database the report's scores are indexed in (default: {DEFAULT_RESULTS_DB})")
+    results_group.add_argument("--no-results-db", action="store_true", help="Do not index the report's scores")
+
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="Always run locally, even if an evaluator daemon is running")
+
+    cache_group = parser.add_argument_group("LLM Response Cache")
+    cache_group.add_argument("--llm-cache", type=str, choices=CACHE_MODES,
+                       help="Cache LLM responses on disk: read-through (serve hits, call on misses), "
+                            "record-only (always call and store) or replay-only (never call the LLM)")
+    cache_group.add_argument("--llm-cache-dir", type=str, default=DEFAULT_CACHE_DIR,
+                       help=f"Directory of the response cache (default: {DEFAULT_CACHE_DIR})")
+    cache_group.add_argument("--llm-cache-max-size", type=float, default=DEFAULT_MAX_SIZE_MB,
+                       help=f"Cache size budget in MB before LRU eviction (default: {DEFAULT_MAX_SIZE_MB})")
+    cache_group.add_argument("--llm-cache-max-age", type=float, default=DEFAULT_MAX_AGE_DAYS,
+                       help=f"Maximum age of cache entries in days (default: {DEFAULT_MAX_AGE_DAYS})")
+    
+    args = parser.parse_args(argv)
+
+    if args.resume:
+        if args.record_session:
+            parser.error("--record-session cannot be used with --resume, replayed tool calls would not be recorded")
+        from event_log import RunLog, run_log_path
+        run_log = RunLog(run_log_path(args.runs_dir, args.resume), resume=True)
+        # The run continues with the options it was started with
+        for option, value in run_log.started_event["config"].items():
+            setattr(args, option, value)
+        run_log.emit("run_resumed")
+        print(f"Resuming run {run_log.run_id} from {run_log.path}")
+    elif not args.mode:
+        parser.error("--mode is required (unless resuming a run with --resume)")
+    else:
+        run_log = None
+    if args.mode != "stress" and any(getattr(args, option) for option in STRESS_OPTIONS):
+        parser.error("--concurrency, --calls-per-level, --rate and --stress-arguments only apply to --mode stress")
+    if args.mode == "stress" and args.max_repairs is not None:
+        parser.error("--max-repairs does not apply to --mode stress")
+    from model_roles import parse_role_model
+    role_models = {}
+    for spec in args.role_models or []:
+        try:
+            role, role_model = parse_role_model(spec)
+        except ValueError as e:
+            parser.error(f"--role-model: {e}")
+        role_models[role] = role_model
 
     # Default server if none specified
-    if not args.server_type:
+    if args.resume or args.replay_session:
+        pass # Tools are served from the session file, no server needed
+    elif not args.server_type:
         print("Warning: No server type specified. Using the time server (stdio) for demo.")
         args.server_type = "stdio"
         # Ensure a default command is provided if params are missing for the default type
@@ -175,46 +494,105 @@ if __name__ == "__main__":
     elif not args.server_params:
          parser.error(f"--server-params is required when --server-type is '{args.server_type}'")
 
-    # Validate OPENAI_API_KEY
+    llm_cache = {
+        "mode": args.llm_cache,
+        "dir": os.path.abspath(args.llm_cache_dir), # The daemon may run from another directory
+        "max_size_mb": args.llm_cache_max_size,
+        "max_age_days": args.llm_cache_max_age,
+    }
+    if args.mode == "stress":
+        # The daemon may run from another directory
+        args.arguments_file = os.path.abspath(args.arguments_file or DEFAULT_STRESS_ARGUMENTS)
+    mode_options = {option: getattr(args, option)
+                    for option in ("max_workers", "shard_size") + (STRESS_OPTIONS if args.mode == "stress"
+                                                                   else ("max_repairs",))
+                    if getattr(args, option) is not None} or None
+    previous_report = os.path.abspath(args.incremental) if args.incremental else None
+    profile = ({"trace_file": os.path.abspath(args.trace_file), "otlp_endpoint": args.otlp_endpoint}
+               if args.profile else None)
+    models = {"model": args.model, "api_base": args.api_base, "roles": role_models,
+              "rpm": args.rpm, "tpm": args.tpm, "max_retries": args.max_retries}
+
+    # Hand the job to a running evaluator daemon, which keeps the server warm between runs.
+    # Session recording/replay happens locally, as the session file lives on this machine.
+    daemon_url = os.getenv(DAEMON_URL_ENV, DEFAULT_DAEMON_URL)
+    daemon = None if args.no_daemon or args.record_session or args.replay_session else daemon_health(daemon_url)
+    # The daemon only appends to event logs under its own runs directory, and only touches files in its workspace
+    if daemon is not None and not within(args.runs_dir, daemon["runs_dir"]):
+        print(f"Running in-process: the evaluator daemon only writes event logs under {daemon['runs_dir']} "
+              f"(see --runs-dir)")
+        daemon = None
+    if daemon is not None:
+        field = outside_workspace({"llm_cache": llm_cache, "profile": profile, "previous_report": previous_report,
+                                   "mode_options": mode_options}, daemon["workspace"])
+        if field is not None:
+            print(f"Running in-process: '{field}' is outside the evaluator daemon's workspace {daemon['workspace']}")
+            daemon = None
+    use_daemon = daemon is not None
+
+    # Validate OPENAI_API_KEY (the daemon uses its own)
     api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+    if not api_key and not use_daemon:
         print("Error: OPENAI_API_KEY environment variable is not set", file=sys.stderr)
         sys.exit(1)
+
+    if run_log is None:
+        from event_log import RunLog, new_run_id, run_log_path
+        run_log = RunLog(run_log_path(args.runs_dir, args.run_id or new_run_id()))
+        run_log.emit("run_started", config={
+            option: getattr(args, option)
+            for option in ("mode", "output", "server_type", "server_params", "replay_session", "replay_latency",
+                           "max_workers", "shard_size", "max_repairs", "incremental", *STRESS_OPTIONS,
+                           *MODEL_OPTIONS)
+        })
+        print(f"Run {run_log.run_id}: logging events to {run_log.path}")
         
     try:
-        server_parameters = get_server_parameters(args.server_type, args.server_params)
-        
-        model = OpenAIServerModel(
-            model_id="gpt-4o", # Use gpt-4o as requested
-            api_key=api_key,
-        )
-
-        # Instantiate the correct evaluation mode based on CLI argument
-        eval_mode: EvaluationMode
-        if args.mode == "introspect":
-            eval_mode = IntrospectionMode()
-        elif args.mode == "interview":
-            eval_mode = InterviewMode()
+        if use_daemon:
+            print(f"Submitting evaluation to the evaluator daemon at {daemon_url}")
+            result = submit_job(daemon_url, {
+                "mode": args.mode,
+                "server_type": args.server_type,
+                "server_params": args.server_params,
+                "llm_cache": llm_cache,
+                "mode_options": mode_options,
+                "previous_report": previous_report,
+                "run_log": os.path.abspath(run_log.path),
+                "resume": bool(args.resume),
+                "profile": profile,
+                "models": models,
+            })
         else:
-            # This case should not happen due to argparse choices, but good for safety
-            print(f"Error: Unknown mode '{args.mode}'", file=sys.stderr)
-            sys.exit(1)
-        
-        # Run the selected evaluation mode within the ToolCollection context
-        with ToolCollection.from_mcp(server_parameters, trust_remote_code=True) as tool_collection:
-            result = eval_mode.run(model, tool_collection)
+            server_parameters = None
+            if not args.replay_session:
+                server_parameters = get_server_parameters(args.server_type, args.server_params)
+            result = run_evaluation(args.mode, server_parameters, api_key, llm_cache=llm_cache,
+                                    record_session=args.record_session, replay_session=args.replay_session,
+                                    replay_latency=args.replay_latency, mode_options=mode_options,
+                                    previous_report=previous_report, run_log=run_log, profile=profile,
+                                    models=models)
 
         # Save the result
         if result:
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            save_report(result, args.output, args.mode, timestamp)
+            save_report(result, args.output, args.mode, timestamp, server=args.server_params or args.replay_session,
+                        results_db=None if args.no_results_db else args.results_db)
+            run_log.emit("run_completed")
         else:
              print("Error: Evaluation did not produce a result.", file=sys.stderr)
              sys.exit(1)
 
     except Exception as e:
+        run_log.emit("run_failed", error=f"{type(e).__name__}: {e}")
         print(f"An unexpected error occurred: {str(e)}", file=sys.stderr)
+        print(f"Completed steps are kept in {run_log.path}; continue with --resume {run_log.run_id}", file=sys.stderr)
         # Optional: Add more detailed traceback logging here if needed
         # import traceback
         # traceback.print_exc()
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)  
+    finally:
+        run_log.close()
+
+
+if __name__ == "__main__":
+    main()
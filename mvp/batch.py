@@ -0,0 +1,257 @@
+"""Fleet evaluation: run many MCP servers x modes from a manifest across a process pool.
+
+Example manifest (YAML or JSON):
+
+    concurrency: 8
+    output: html
+    output_dir: batch_reports
+    modes: [introspect, interview]      # default modes for every server
+    servers:
+      - name: time
+        server_type: stdio
+        server_params: "uvx mcp-server-time --local-timezone=UTC"
+      - name: remote
+        server_type: sse
+        server_params: "https://example.com/mcp-endpoint"
+        modes: [introspect]             # per-server override
+        record_session: true            # capture MCP traffic to <output_dir>/<name>/<mode>_session.json.gz
+      - name: offline
+        replay_session: sessions/time.json.gz   # serve tools from a recording, no server started
+    profile: true                       # optional (also per server): trace to <output_dir>/<name>/<mode>_traces.jsonl,
+                                        # or {otlp_endpoint: http://localhost:4318/v1/traces}
+    incremental: true                   # optional (also per server): only re-test tools changed since the
+                                        # latest JSON report in <output_dir>/<name>/
+    mode_options:                       # optional, per-mode constructor options (also per server)
+      introspect: {max_workers: 8, shard_size: 30, max_repairs: 3}
+      interview: {max_workers: 4, capabilities_per_interview: 2}
+      stress: {concurrency: [1, 8, 32], calls_per_level: 100}
+    models:                             # optional (also per server): models by role and rate limits
+      model: gpt-4o                     # (see model_roles.py)
+      roles: {candidate: {model_id: gpt-4o-mini}, scorer: {model_id: llama3, api_base: "http://localhost:8000/v1"}}
+      rpm: 500
+    llm_cache:                          # optional, shared by all jobs (see llm_cache.py)
+      mode: read-through
+      dir: .llm_cache
+    results_db: results.db              # optional, where scores are indexed under the server name (null disables)
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List
+
+import yaml
+from defaults import DEFAULT_RESULTS_DB
+from fingerprint import latest_report
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_OUTPUT_DIR = "batch_reports"
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    """Load a YAML or JSON manifest (YAML is a superset of JSON)."""
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = yaml.safe_load(f)
+    if not isinstance(manifest, dict) or not manifest.get("servers"):
+        raise ValueError(f"Manifest {path} must be a mapping with a non-empty 'servers' list")
+    return manifest
+
+
+def build_jobs(manifest: Dict[str, Any], output: str, output_dir: str) -> List[Dict[str, Any]]:
+    """Expand the manifest into one job per server x mode."""
+    from agent_evaluator import MODES, POSITIVE_OPTIONS
+
+    default_modes = manifest.get("modes") or list(MODES)
+    jobs = []
+    seen_names = set()
+    for index, server in enumerate(manifest["servers"]):
+        if not isinstance(server, dict) or not (server.get("server_params") or server.get("replay_session")):
+            raise ValueError(f"Server entry #{index} must define 'server_params' (or 'replay_session')")
+        # Names are used as directory names, keep them filesystem friendly and unique
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(server.get("name") or f"server{index}"))
+        if name in seen_names:
+            name = f"{name}_{index}"
+        seen_names.add(name)
+
+        server_type = server.get("server_type", "stdio")
+        if server_type not in ("stdio", "sse"):
+            raise ValueError(f"Unknown server type '{server_type}' for server '{name}'")
+
+        modes = server.get("modes") or default_modes
+        # A single mode given as a string would otherwise be iterated letter by letter
+        if not isinstance(modes, list) or not all(isinstance(mode, str) for mode in modes):
+            raise ValueError(f"'modes' for server '{name}' must be a list of mode names")
+        incremental = server.get("incremental", manifest.get("incremental", False))
+        profile = server.get("profile", manifest.get("profile"))
+        # An empty YAML key is None, fall back as if it were not there
+        mode_options = server.get("mode_options") or manifest.get("mode_options") or {}
+        if not isinstance(mode_options, dict):
+            raise ValueError(f"'mode_options' for server '{name}' must be a mapping of mode to options")
+        for mode in modes:
+            if mode not in MODES:
+                raise ValueError(f"Unknown mode '{mode}' for server '{name}'")
+            if not isinstance(mode_options.get(mode) or {}, dict):
+                raise ValueError(f"'mode_options.{mode}' for server '{name}' must be a mapping")
+            for option in POSITIVE_OPTIONS:
+                value = (mode_options.get(mode) or {}).get(option)
+                if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+                    raise ValueError(f"'mode_options.{mode}.{option}' for server '{name}' must be an integer of "
+                                     f"at least 1, got {value!r}")
+            jobs.append({
+                "name": name,
+                "mode": mode,
+                "server_type": server_type,
+                "server_params": server.get("server_params"),
+                "output": server.get("output", output),
+                "llm_cache": server.get("llm_cache", manifest.get("llm_cache")),
+                "replay_session": server.get("replay_session"),
+                "mode_options": mode_options.get(mode),
+                # One recording per server x mode, the traffic differs between modes
+                "record_session": (os.path.join(output_dir, name, f"{mode}_session.json.gz")
+                                   if server.get("record_session") else None),
+                "output_dir": os.path.join(output_dir, name),
+                "results_db": manifest.get("results_db", DEFAULT_RESULTS_DB),
+                # The first run of a server has nothing to diff against and evaluates everything
+                "previous_report": latest_report(os.path.join(output_dir, name), mode) if incremental else None,
+                "models": server.get("models", manifest.get("models")),
+                "profile": ({"trace_file": os.path.join(output_dir, name, f"{mode}_traces.jsonl"),
+                             "otlp_endpoint": profile.get("otlp_endpoint") if isinstance(profile, dict) else None}
+                            if profile else None),
+            })
+    return jobs
+
+
+def run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one evaluation job inside a pool worker, never raising."""
+    from agent_evaluator import get_server_parameters, run_evaluation, save_report
+
+    record = {key: job[key] for key in ("name", "mode", "server_type", "server_params")}
+    record["status"] = "succeeded"
+    os.makedirs(job["output_dir"], exist_ok=True)
+    log_path = os.path.join(job["output_dir"], f"{job['mode']}.log")
+    record["log_file"] = log_path
+
+    started = time.perf_counter()
+    # Keep each job's agent logs apart instead of interleaving them on the console
+    with open(log_path, "w", encoding="utf-8") as log_file, \
+            contextlib.redirect_stdout(log_file), contextlib.redirect_stderr(log_file):
+        try:
+            api_key = os.getenv("OPENAI_API_KEY")
+            server_parameters = None
+            if not job.get("replay_session"):
+                server_parameters = get_server_parameters(job["server_type"], job["server_params"])
+            result = run_evaluation(job["mode"], server_parameters, api_key, llm_cache=job.get("llm_cache"),
+                                    record_session=job.get("record_session"),
+                                    replay_session=job.get("replay_session"),
+                                    mode_options=job.get("mode_options"),
+                                    previous_report=job.get("previous_report"),
+                                    profile=job.get("profile"), models=job.get("models"))
+            if not result:
+                raise RuntimeError("Evaluation did not produce a result.")
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            save_report(result, job["output"], job["mode"], timestamp, output_dir=job["output_dir"],
+                        server=job["name"], results_db=job.get("results_db"))
+        # get_server_parameters exits on bad input; contain that to this job as well
+        except (Exception, SystemExit) as e:
+            traceback.print_exc()
+            record["status"] = "failed"
+            record["error"] = f"{type(e).__name__}: {e}"
+    record["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def run_batch(jobs: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """Fan the jobs out over a process pool and collect a combined summary."""
+    started_at = datetime.datetime.now()
+    started = time.perf_counter()
+    records = []
+
+    # Spawned, single-use workers: the MCP client runs its own event loop thread,
+    # which does not survive fork, and a leaky server must not affect the next job.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=concurrency, mp_context=context, max_tasks_per_child=1) as pool:
+        futures = {pool.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. a crashing server took it down)
+                record = {key: job[key] for key in ("name", "mode", "server_type", "server_params")}
+                record.update(status="failed", error=f"{type(e).__name__}: {e}")
+            records.append(record)
+            status = "ok" if record["status"] == "succeeded" else f"FAILED ({record.get('error')})"
+            print(f"[{len(records)}/{len(jobs)}] {record['name']} / {record['mode']}: {status}")
+
+    wall_time = time.perf_counter() - started
+    succeeded = sum(1 for r in records if r["status"] == "succeeded")
+    return {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "wall_time_seconds": round(wall_time, 3),
+        "concurrency": concurrency,
+        "total": len(records),
+        "succeeded": succeeded,
+        "failed": len(records) - succeeded,
+        "evaluations_per_minute": round(succeeded / (wall_time / 60), 3) if wall_time > 0 else 0.0,
+        "jobs": sorted(records, key=lambda r: (r["name"], r["mode"])),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="agent_evaluator.py batch",
+        description="Evaluate many MCP servers from a YAML/JSON manifest across a worker pool",
+    )
+    parser.add_argument("manifest", type=str, help="Path to the YAML/JSON manifest of servers x modes")
+    parser.add_argument("--concurrency", type=int,
+                        help=f"Maximum number of concurrent evaluations (default: manifest value or {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--output", type=str, choices=["json", "yaml", "html", "html-offline"],
+                        help="Per-run report format (default: manifest value or json)")
+    parser.add_argument("--output-dir", type=str,
+                        help=f"Directory for per-run reports and the summary (default: manifest value or {DEFAULT_OUTPUT_DIR})")
+    args = parser.parse_args(argv)
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("Error: OPENAI_API_KEY environment variable is not set", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        manifest = load_manifest(args.manifest)
+        concurrency = args.concurrency or manifest.get("concurrency", DEFAULT_CONCURRENCY)
+        output = args.output or manifest.get("output", "json")
+        output_dir = args.output_dir or manifest.get("output_dir", DEFAULT_OUTPUT_DIR)
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if output == "console":
+            raise ValueError("console output is not supported in batch mode")
+        jobs = build_jobs(manifest, output, output_dir)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error loading manifest: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Running {len(jobs)} evaluations with concurrency {concurrency}...")
+    summary = run_batch(jobs, concurrency)
+
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    summary_file = os.path.join(output_dir, f"batch_summary_{timestamp}.json")
+    with open(summary_file, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    print(f"Completed {summary['succeeded']}/{summary['total']} evaluations "
+          f"in {summary['wall_time_seconds']:.1f}s ({summary['evaluations_per_minute']:.2f} evaluations/min)")
+    print(f"Batch summary saved as {summary_file}")
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Offline benchmarks of the evaluator's own overhead: no OpenAI, no real MCP server.
+
+Every case (mode x number of tools) runs in a fresh process against the
+synthetic stub server and the scripted model, and records:
+
+    import_seconds   importing the evaluator, smolagents and mcp
+    startup_seconds  starting the stub server and loading its tools
+    wall_seconds     the evaluation itself (mode.run)
+    render_seconds   save_report to HTML (plus its raw JSON)
+    peak_memory_mb   peak resident memory of the process
+
+Run from the mvp directory:
+
+    python -m benchmarks.run --tools 10 100 1000 --output benchmark_results.json
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.25
+
+With --baseline, metrics more than --tolerance above the baseline are flagged
+and the exit status is 1.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+DEFAULT_TOOL_COUNTS = [10, 100, 1000]
+DEFAULT_MODES = ["introspect", "interview"]
+DEFAULT_OUTPUT = "benchmark_results.json"
+DEFAULT_TOLERANCE = 0.2
+METRICS = ("import_seconds", "startup_seconds", "wall_seconds", "render_seconds", "peak_memory_mb")
+STUB_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_server.py")
+
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one benchmark case; meant to be the only work of a fresh process."""
+    started = time.perf_counter()
+    from agent_evaluator import create_mode, save_report
+    from mcp import StdioServerParameters
+    from mcp_session import open_tool_collection
+
+    from benchmarks.scripted_model import ScriptedModel
+    import_seconds = time.perf_counter() - started
+
+    server_parameters = StdioServerParameters(
+        command=sys.executable,
+        args=[STUB_SERVER, "--tools", str(case["tools"]), "--latency", str(case["tool_latency"])],
+    )
+    model = ScriptedModel(latency=case["model_latency"])
+    eval_mode = create_mode(case["mode"], **case.get("mode_options", {}))
+
+    # Agent logs would drown the benchmark output (and printing them is not what is measured)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        with open_tool_collection(server_parameters) as tool_collection:
+            startup_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            result = eval_mode.run(model, tool_collection)
+            wall_seconds = time.perf_counter() - started
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            started = time.perf_counter()
+            save_report(result, "html", case["mode"], "benchmark", output_dir=output_dir)
+            render_seconds = time.perf_counter() - started
+
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_memory_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    return {
+        "import_seconds": round(import_seconds, 4),
+        "startup_seconds": round(startup_seconds, 4),
+        "wall_seconds": round(wall_seconds, 4),
+        "render_seconds": round(render_seconds, 4),
+        "peak_memory_mb": round(peak_memory_mb, 1),
+        "model_calls": model.calls,
+    }
+
+
+def run_benchmarks(cases: List[Dict[str, Any]], repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Run every case `repeat` times, each in a new process, and keep the median of each metric."""
+    results = {}
+    # A fresh process per run, so import time and peak memory are not shared between cases
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                             max_tasks_per_child=1) as pool:
+        for case in cases:
+            name = f"{case['mode']}/{case['tools']}"
+            runs = [pool.submit(run_case, case).result() for _ in range(repeat)]
+            results[name] = {metric: statistics.median(run[metric] for run in runs) for metric in METRICS}
+            results[name]["model_calls"] = runs[0]["model_calls"]
+            print(f"{name:<20} " + "  ".join(f"{metric}={results[name][metric]}" for metric in METRICS))
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            tolerance: float) -> List[Dict[str, Any]]:
+    """Compare every metric against the baseline, flagging those more than `tolerance` worse."""
+    comparisons = []
+    for name, metrics in results.items():
+        for metric in METRICS:
+            previous = baseline.get(name, {}).get(metric)
+            if not previous:
+                continue
+            change = (metrics[metric] - previous) / previous
+            comparisons.append({
+                "case": name,
+                "metric": metric,
+                "baseline": previous,
+                "current": metrics[metric],
+                "change": round(change, 4),
+                "regression": change > tolerance,
+            })
+    return comparisons
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the evaluator with a stub server and a scripted model")
+    parser.add_argument("--tools", type=int, nargs="+", default=DEFAULT_TOOL_COUNTS,
+                        help=f"Numbers of tools exposed by the stub server (default: {DEFAULT_TOOL_COUNTS})")
+    parser.add_argument("--modes", nargs="+", choices=DEFAULT_MODES, default=DEFAULT_MODES,
+                        help="Evaluation modes to benchmark (default: all)")
+    parser.add_argument("--tool-latency", type=float, default=0.005,
+                        help="Seconds every stub tool call takes (default: 0.005)")
+    parser.add_argument("--model-latency", type=float, default=0.0,
+                        help="Seconds every scripted model call takes (default: 0)")
+    parser.add_argument("--max-workers", type=int, default=4, help="max_workers of the modes (default: 4)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case, the median is kept (default: 1)")
+    parser.add_argument("--output", type=str, default=DEFAULT_OUTPUT,
+                        help=f"Where to write the results (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--baseline", type=str, help="Results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Relative slowdown tolerated before flagging a regression (default: {DEFAULT_TOLERANCE})")
+    parser.add_argument("--save-baseline", type=str, metavar="PATH", help="Also write the results as a new baseline")
+    args = parser.parse_args(argv)
+
+    cases = [
+        {"mode": mode, "tools": tools, "tool_latency": args.tool_latency, "model_latency": args.model_latency,
+         "mode_options": {"max_workers": args.max_workers}}
+        for mode in args.modes for tools in args.tools
+    ]
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"tool_latency": args.tool_latency, "model_latency": args.model_latency,
+                     "max_workers": args.max_workers, "repeat": args.repeat},
+        "results": run_benchmarks(cases, args.repeat),
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(report["results"], baseline["results"], args.tolerance)
+        regressions = [c for c in report["comparison"] if c["regression"]]
+        for c in report["comparison"]:
+            flag = "REGRESSION" if c["regression"] else ""
+            print(f"{c['case']:<20} {c['metric']:<16} {c['baseline']:>10} -> {c['current']:>10} "
+                  f"({c['change']:+.1%}) {flag}")
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Benchmark results saved as {path}")
+
+    if regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
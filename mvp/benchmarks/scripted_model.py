@@ -0,0 +1,151 @@
+"""Deterministic stand-in for OpenAIServerModel, scripted for the evaluation modes.
+
+Requests are recognized by the response schema the mode embeds in its prompt
+(plan, metrics, shard plan, scores, intake, sub-interview, summary, stress arguments) and answered
+with canned JSON sized from the tools in play; requests to repair a section
+that failed validation get the whole section again. Tool-calling agents call one tool and then give
+their final answer; the code-writing interviewer asks the candidate once and
+then hands in its findings. The same request always gets the same answer.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from smolagents import Model, Tool
+from smolagents.models import ChatMessage, ChatMessageToolCall, ChatMessageToolCallDefinition, MessageRole
+
+# Dummy values for tool inputs, by JSON schema type
+ARGUMENT_VALUES = {"string": "benchmark", "integer": 1, "number": 1.5, "boolean": True, "array": [], "object": {}}
+
+
+def _text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            parts.append(content)
+        elif content:
+            parts.extend(item.get("text", "") for item in content if isinstance(item, dict))
+    return "\n".join(parts)
+
+
+class ScriptedModel(Model):
+    """Deterministic model answering the prompts of IntrospectionMode, InterviewMode and StressMode."""
+
+    def __init__(self, latency: float = 0.0, max_tasks: int = 12, max_capabilities: int = 6,
+                 tools_per_task: int = 3):
+        super().__init__()
+        self.model_id = "scripted"
+        self.latency = latency
+        self.max_tasks = max_tasks
+        self.max_capabilities = max_capabilities
+        self.tools_per_task = tools_per_task
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(
+        self,
+        messages: List[Dict[str, Any]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+        text = _text(messages)
+        if tools_to_call_from:
+            message = self._tool_call(messages, tools_to_call_from)
+        else:
+            message = ChatMessage(role=MessageRole.ASSISTANT, content=self._answer(messages, text))
+        # Rough token estimate, enough to exercise token accounting, reported like OpenAI's usage
+        input_tokens, output_tokens = len(text) // 4, len(message.content or "") // 4 + 10
+        self.last_input_token_count, self.last_output_token_count = input_tokens, output_tokens
+        message.raw = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=input_tokens, completion_tokens=output_tokens))
+        return message
+
+    def _tool_call(self, messages: List[Dict[str, Any]], tools: List[Tool]) -> ChatMessage:
+        if any(message["role"] == MessageRole.TOOL_RESPONSE for message in messages):
+            name, arguments = "final_answer", {"answer": "Called the tool and got a well-formed result."}
+        else:
+            tool = next((t for t in tools if t.name != "final_answer"), tools[0])
+            name = tool.name
+            arguments = {key: ARGUMENT_VALUES.get(spec.get("type"), "benchmark") for key, spec in tool.inputs.items()}
+            if name == "final_answer":
+                arguments = {"answer": "No tools to call."}
+        call = ChatMessageToolCall(
+            id=hashlib.sha1(json.dumps([name, arguments]).encode()).hexdigest()[:8],
+            type="function",
+            function=ChatMessageToolCallDefinition(name=name, arguments=arguments),
+        )
+        return ChatMessage(role=MessageRole.ASSISTANT, content="", tool_calls=[call])
+
+    def _answer(self, messages: List[Dict[str, Any]], text: str) -> str:
+        tool_names = sorted(set(re.findall(r"^- (\w+): ", text, re.MULTILINE)))
+        if "_IntrospectionPlanModel" in text:
+            return json.dumps(self._plan(tool_names))
+        if "_IntrospectionShardPlanModel" in text:
+            plan = self._plan(tool_names)
+            del plan["evaluation_metrics"]
+            return json.dumps(plan)
+        if "_IntrospectionMetricsModel" in text:
+            return json.dumps({"evaluation_metrics": self._plan(tool_names)["evaluation_metrics"]})
+        if "_IntrospectionScoresModel" in text:
+            metrics = re.findall(r"^\s*- (metric_\d+): ", text, re.MULTILINE)
+            return json.dumps({"final_metric_scores": {name: 0.8 for name in metrics}})
+        if "_InterviewIntakeModel" in text:
+            count = max(1, min(self.max_capabilities, len(tool_names)))
+            return json.dumps({"declared_capabilities": [
+                {"name": f"capability_{i:02d}", "description": f"Uses tools of group {i}", "confidence": 0.9}
+                for i in range(count)
+            ]})
+        if "_SubInterviewResultModel" in text:
+            if "## Schema of the Fields to Correct" in text:
+                return json.dumps(self._sub_interview_result(text))
+            return self._sub_interview_step(messages, text)
+        if "_StressArgumentsModel" in text:
+            tool_inputs = re.findall(r"^\s*- (\w+): .*\n\s+inputs: (.*)$", text, re.MULTILINE)
+            return json.dumps({"tool_arguments": [
+                {"tool": name, "arguments": {key: ARGUMENT_VALUES.get(spec.get("type"), "benchmark")
+                                             for key, spec in json.loads(inputs).items()}}
+                for name, inputs in tool_inputs
+            ]})
+        if "_InterviewSummaryModel" in text:
+            return json.dumps({"candidate_overview": "Scripted candidate.", "overall_assessment": "Scripted assessment."})
+        return "{}"
+
+    def _plan(self, tool_names: List[str]) -> Dict[str, Any]:
+        groups = [tool_names[i:i + self.tools_per_task] for i in range(0, len(tool_names), self.tools_per_task)]
+        groups = groups[:self.max_tasks] or [[]]
+        return {
+            "capability_overview": f"Scripted overview of {len(tool_names)} tools.",
+            "capability_list": [{"name": f"capability_{i:02d}", "description": ", ".join(group), "tools": group}
+                                for i, group in enumerate(groups)],
+            "evaluation_metrics": [{"name": f"metric_{i}", "description": f"Scripted metric {i}"} for i in range(6)],
+            "evaluation_tasks": [{"id": i + 1, "description": f"Call {', '.join(group) or 'any tool'} once",
+                                  "tools": group} for i, group in enumerate(groups)],
+        }
+
+    def _sub_interview_result(self, text: str) -> Dict[str, Any]:
+        capabilities = sorted(set(re.findall(r"^\s*- (capability_\d+): ", text, re.MULTILINE)))
+        return {
+            "questions_and_answers": [{"id": 1, "question": "Demonstrate your capability.", "answer": "Done."}],
+            "verified_capabilities": [{"name": name, "description": "Verified by the script", "confidence": 0.8}
+                                      for name in capabilities],
+            "capability_scores": {name: 0.8 for name in capabilities},
+        }
+
+    def _sub_interview_step(self, messages: List[Dict[str, Any]], text: str) -> str:
+        if not any(message["role"] == MessageRole.TOOL_RESPONSE for message in messages):
+            return ("Thought: Ask the candidate to demonstrate the capability.\nCode:\n```py\n"
+                    "answer = CandidateAgent(task='Demonstrate your capability with one tool call.')\n"
+                    "print(answer)\n```<end_code>")
+        result = self._sub_interview_result(text)
+        return f"Thought: Done.\nCode:\n```py\nfinal_answer({json.dumps(json.dumps(result))})\n```<end_code>"
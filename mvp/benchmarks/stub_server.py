@@ -0,0 +1,53 @@
+"""Synthetic MCP server exposing a configurable number of tools with a configurable latency.
+
+    python benchmarks/stub_server.py --tools 100 --latency 0.01
+
+Tools cycle through a few input schemas so that prompts and adapted tools look
+like those of a real server. Every call sleeps for the latency and returns a
+deterministic answer.
+"""
+
+import argparse
+import asyncio
+
+from mcp.server.fastmcp import FastMCP
+
+
+def make_tools(index: int, latency: float):
+    async def lookup(query: str, limit: int = 5) -> str:
+        await asyncio.sleep(latency)
+        return f"tool_{index:04d} found {limit} results for '{query}'"
+
+    async def convert(value: float, unit: str) -> str:
+        await asyncio.sleep(latency)
+        return f"tool_{index:04d} converted {value} to {value * 2} {unit}"
+
+    async def toggle(name: str, enabled: bool = True) -> str:
+        await asyncio.sleep(latency)
+        return f"tool_{index:04d} set '{name}' to {'on' if enabled else 'off'}"
+
+    return [lookup, convert, toggle]
+
+
+def build_server(tools: int, latency: float) -> FastMCP:
+    server = FastMCP("benchmark-stub", log_level="WARNING")
+    for index in range(tools):
+        func = make_tools(index, latency)[index % 3]
+        server.add_tool(
+            func,
+            name=f"tool_{index:04d}",
+            description=f"Synthetic benchmark tool #{index}: {func.__name__}s items of group {index % 7}.",
+        )
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic MCP server for benchmarks")
+    parser.add_argument("--tools", type=int, default=10, help="Number of tools to expose (default: 10)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every tool call takes (default: 0)")
+    args = parser.parse_args()
+    build_server(args.tools, args.latency).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""Long-lived evaluator daemon with a pool of warm MCP server sessions.
+
+Starting a stdio server (often through `uvx`) and running the MCP initialize
+handshake costs seconds per evaluation. The daemon keeps initialized sessions
+around, keyed by server parameters, health-checks them with an MCP ping before
+leasing them to a job, and recycles them after a number of uses, after an idle
+timeout, or as soon as a job using them fails.
+
+HTTP API (JSON, localhost only by default):
+    GET  /health  -> {"status": "ok", "pool": {...}, "runs_dir": ..., "workspace": ...}
+    POST /jobs    {"mode": ..., "server_type": ..., "server_params": ..., "mode_options": {...},
+                   "llm_cache": {...}, "previous_report": ...,
+                   "run_log": ..., "resume": ..., "profile": {...}, "models": {...}}
+                  -> {"result": ...} or {"error": ...}
+
+Jobs run concurrently and share one request scheduler, so the rate limits of
+an endpoint hold across all of them (see scheduler.py).
+
+A job runs the server command it is given, so requests are only accepted
+with the daemon's secret as a bearer token. The daemon writes a new secret to
+a file only its user can read each time it starts, and clients read it from
+there. Requests must also name a local Host (against DNS rebinding) and jobs
+must be sent as application/json, which a web page cannot do without CORS.
+Every file a job names must lie in the daemon's workspace (its LLM cache,
+trace file, previous report and stress arguments file), and its event log under
+the daemon's runs directory.
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+from defaults import DEFAULT_RUNS_DIR
+
+# The client side (daemon_health, submit_job) is used by every CLI run, the MCP stack is only
+# imported by the daemon process itself
+if TYPE_CHECKING:
+    from mcp import StdioServerParameters
+    from smolagents import ToolCollection
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_USES = 20
+DEFAULT_IDLE_TIMEOUT = 600
+HEALTH_CHECK_TIMEOUT = 5
+# Clients find the daemon through this variable, falling back to the default address
+DAEMON_URL_ENV = "VIBE_EVALUATOR_DAEMON"
+DEFAULT_DAEMON_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+# The daemon's secret, written on start; clients read it from the path in this variable or the default
+DAEMON_TOKEN_FILE_ENV = "VIBE_EVALUATOR_DAEMON_TOKEN_FILE"
+DEFAULT_TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".vibe-evaluator", "daemon.token")
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "[::1]")
+
+
+def write_token(path: str) -> str:
+    """Generate a new daemon secret and write it to a file readable by the current user only."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+    token = secrets.token_urlsafe(32)
+    # Never follow a symlink planted at the path, and tighten the mode of a file left by an earlier daemon
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0), 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        os.fchmod(f.fileno(), 0o600)
+        f.write(token)
+    return token
+
+
+def read_token(path: Optional[str] = None) -> Optional[str]:
+    """The running daemon's secret, or None if there is no token file to read."""
+    path = path or os.getenv(DAEMON_TOKEN_FILE_ENV, DEFAULT_TOKEN_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def within(path: str, directory: str) -> bool:
+    """Whether path is directory or lies under it, symlinks resolved."""
+    path, directory = os.path.realpath(path), os.path.realpath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+
+def job_paths(job: Dict[str, Any]) -> Dict[str, str]:
+    """Files a job has the daemon read or write, besides its event log, by the job field naming them."""
+    paths = {
+        "llm_cache.dir": (job.get("llm_cache") or {}).get("dir"),
+        "profile.trace_file": (job.get("profile") or {}).get("trace_file"),
+        "previous_report": job.get("previous_report"),
+        "mode_options.arguments_file": (job.get("mode_options") or {}).get("arguments_file"),
+    }
+    return {field: path for field, path in paths.items() if path}
+
+
+def outside_workspace(job: Dict[str, Any], workspace: str) -> Optional[str]:
+    """The first job field naming a file outside the workspace, if any."""
+    return next((field for field, path in job_paths(job).items() if not within(path, workspace)), None)
+
+
+def server_key(server_parameters: "StdioServerParameters | Dict[str, Any]") -> str:
+    """Stable identity of a server configuration, used to key the pool."""
+    if isinstance(server_parameters, dict):
+        return json.dumps(server_parameters, sort_keys=True, default=str)
+    return json.dumps(server_parameters.model_dump(mode="json"), sort_keys=True)
+
+
+class PooledSession:
+    """An initialized MCP session together with the tools adapted from it."""
+
+    def __init__(self, server_parameters: "StdioServerParameters | Dict[str, Any]"):
+        from mcpadapt.core import MCPAdapt
+        from smolagents import ToolCollection
+
+        from mcp_session import tool_adapter
+
+        self.adapt = MCPAdapt(server_parameters, tool_adapter())
+        started = time.perf_counter()
+        self.tool_collection = ToolCollection(self.adapt.__enter__())
+        self.startup_time = time.perf_counter() - started
+        self.uses = 0
+        self.last_used = time.time()
+
+    def healthy(self) -> bool:
+        if not self.adapt.thread.is_alive():
+            return False
+        try:
+            future = asyncio.run_coroutine_threadsafe(self.adapt.sessions[0].send_ping(), self.adapt.loop)
+            future.result(timeout=HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        try:
+            self.adapt.close()
+        except Exception:
+            pass
+
+
+class ServerPool:
+    """Pool of warm MCP sessions keyed by server parameters.
+
+    A session is leased to one job at a time; concurrent jobs for the same
+    server get additional sessions, which are all kept warm afterwards.
+    """
+
+    def __init__(self, max_uses: int = DEFAULT_MAX_USES, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[str, List[PooledSession]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"started": 0, "reused": 0, "recycled": 0, "failed_health_checks": 0,
+                      "startup_seconds": 0.0}
+
+    def _take_idle(self, key: str) -> Optional[PooledSession]:
+        while True:
+            with self._lock:
+                sessions = self._idle.get(key)
+                if not sessions:
+                    return None
+                session = sessions.pop()
+            if session.healthy():
+                return session
+            with self._lock:
+                self.stats["failed_health_checks"] += 1
+            session.close()
+
+    def _reap_idle(self):
+        """Close sessions that have not been used for longer than the idle timeout."""
+        now = time.time()
+        expired = []
+        with self._lock:
+            for key, sessions in self._idle.items():
+                expired.extend(s for s in sessions if now - s.last_used > self.idle_timeout)
+                self._idle[key] = [s for s in sessions if now - s.last_used <= self.idle_timeout]
+            self.stats["recycled"] += len(expired)
+        for session in expired:
+            session.close()
+
+    @contextmanager
+    def lease(self, server_parameters: "StdioServerParameters | Dict[str, Any]") -> Iterator["ToolCollection"]:
+        self._reap_idle()
+        key = server_key(server_parameters)
+        session = self._take_idle(key)
+        if session is None:
+            session = PooledSession(server_parameters)
+            with self._lock:
+                self.stats["started"] += 1
+                self.stats["startup_seconds"] += session.startup_time
+        else:
+            with self._lock:
+                self.stats["reused"] += 1
+
+        try:
+            yield session.tool_collection
+        except BaseException:
+            # The failure may have left the session in a bad state, do not hand it out again
+            with self._lock:
+                self.stats["recycled"] += 1
+            session.close()
+            raise
+
+        session.uses += 1
+        session.last_used = time.time()
+        if session.uses >= self.max_uses:
+            with self._lock:
+                self.stats["recycled"] += 1
+            session.close()
+        else:
+            with self._lock:
+                self._idle.setdefault(key, []).append(session)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["idle_sessions"] = sum(len(sessions) for sessions in self._idle.values())
+        stats["startup_seconds"] = round(stats["startup_seconds"], 3)
+        return stats
+
+    def close(self):
+        with self._lock:
+            sessions = [s for group in self._idle.values() for s in group]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
+
+
+def run_job(pool: ServerPool, job: Dict[str, Any], runs_dir: str, workspace: str) -> Any:
+    """Run one submitted evaluation job on a leased warm session."""
+    from agent_evaluator import attach_metadata, get_server_parameters, run_evaluation
+    from event_log import RunLog
+
+    if job.get("run_log") and not (job["run_log"].endswith(".jsonl") and within(job["run_log"], runs_dir)):
+        raise ValueError(f"Event logs must be .jsonl files under the daemon's runs directory {runs_dir}")
+    field = outside_workspace(job, workspace)
+    if field is not None:
+        raise ValueError(f"'{field}' must be a path in the daemon's workspace {workspace}")
+    server_parameters = get_server_parameters(job.get("server_type", "stdio"), job.get("server_params"))
+    # The client owns the run and its event log, the daemon appends the model and tool calls to it
+    run_log = RunLog(job["run_log"], resume=job.get("resume", False)) if job.get("run_log") else None
+    started = time.perf_counter()
+    try:
+        result = run_evaluation(
+            job["mode"],
+            server_parameters,
+            os.getenv("OPENAI_API_KEY"),
+            llm_cache=job.get("llm_cache"),
+            mode_options=job.get("mode_options"),
+            server_pool=pool,
+            previous_report=job.get("previous_report"),
+            run_log=run_log,
+            profile=job.get("profile"),
+            models=job.get("models"),
+        )
+    finally:
+        if run_log is not None:
+            run_log.close()
+    return attach_metadata(result, "daemon", {
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "pool": pool.summary(),
+    })
+
+
+def make_handler(pool: ServerPool, token: str, port: int, runs_dir: str, workspace: str, host: str = DEFAULT_HOST):
+    allowed_hosts = {f"{name}:{port}" for name in {*LOCAL_HOSTS, host}}
+
+    class DaemonRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, body: Dict[str, Any]):
+            data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _authorized(self) -> bool:
+            """Check the Host and the secret, answering the request if either is wrong."""
+            if self.headers.get("Host") not in allowed_hosts:
+                self._send_json(403, {"error": "Unexpected Host header"})
+                return False
+            scheme, _, presented = (self.headers.get("Authorization") or "").partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(presented.encode(), token.encode()):
+                self._send_json(401, {"error": "Missing or wrong daemon token"})
+                return False
+            return True
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok", "pool": pool.summary(), "runs_dir": runs_dir,
+                                      "workspace": workspace})
+            else:
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            if self.path != "/jobs":
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            if self.headers.get_content_type() != "application/json":
+                self._send_json(415, {"error": "Jobs must be sent as application/json"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                job = json.loads(self.rfile.read(length))
+                result = run_job(pool, job, runs_dir, workspace)
+                self._send_json(200, {"result": result})
+            # get_server_parameters exits on bad input; that must not take the daemon down
+            except (Exception, SystemExit) as e:
+                traceback.print_exc()
+                self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+    return DaemonRequestHandler
+
+
+def _headers() -> Dict[str, str]:
+    return {"Authorization": f"Bearer {read_token() or ''}"}
+
+
+def daemon_health(url: str, timeout: float = 0.5) -> Optional[Dict[str, Any]]:
+    """The health of the evaluator daemon at the given URL, or None if none answers to our token."""
+    if read_token() is None:
+        return None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(f"{url}/health", headers=_headers()),
+                                    timeout=timeout) as response:
+            health = json.loads(response.read())
+    except (OSError, ValueError):
+        return None
+    return health if health.get("status") == "ok" else None
+
+
+def submit_job(url: str, job: Dict[str, Any]) -> Any:
+    """Submit an evaluation job to the daemon and wait for its result."""
+    request = urllib.request.Request(
+        f"{url}/jobs",
+        data=json.dumps(job).encode("utf-8"),
+        headers={"Content-Type": "application/json", **_headers()},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())["result"]
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"Daemon job failed: {json.loads(e.read()).get('error')}") from e
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="agent_evaluator.py daemon",
+        description="Run the evaluator daemon that keeps a pool of warm MCP server sessions",
+    )
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help=f"Address to bind (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--max-uses", type=int, default=DEFAULT_MAX_USES,
+                        help=f"Recycle a server session after this many jobs (default: {DEFAULT_MAX_USES})")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help=f"Close sessions idle for this many seconds (default: {DEFAULT_IDLE_TIMEOUT})")
+    parser.add_argument("--token-file", type=str,
+                        help=f"File to write the daemon's secret to (default: ${DAEMON_TOKEN_FILE_ENV} or "
+                             f"{DEFAULT_TOKEN_FILE})")
+    parser.add_argument("--runs-dir", type=str, default=DEFAULT_RUNS_DIR,
+                        help=f"Directory jobs may write event logs to (default: {DEFAULT_RUNS_DIR})")
+    parser.add_argument("--workspace", type=str, default=".",
+                        help="Directory every other file a job reads or writes (LLM cache, traces, previous "
+                             "reports, stress arguments) must lie in (default: the current directory)")
+    args = parser.parse_args(argv)
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("Error: OPENAI_API_KEY environment variable is not set", file=sys.stderr)
+        sys.exit(1)
+
+    token_file = args.token_file or os.getenv(DAEMON_TOKEN_FILE_ENV, DEFAULT_TOKEN_FILE)
+    token = write_token(token_file)
+    runs_dir = os.path.realpath(args.runs_dir)
+    os.makedirs(runs_dir, exist_ok=True)
+    workspace = os.path.realpath(args.workspace)
+    pool = ServerPool(max_uses=args.max_uses, idle_timeout=args.idle_timeout)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(pool, token, args.port, runs_dir, workspace,
+                                                                      args.host))
+    print(f"Evaluator daemon listening on http://{args.host}:{args.port} "
+          f"(set {DAEMON_URL_ENV} if not using the default address), token in {token_file}, "
+          f"event logs under {runs_dir}, workspace {workspace}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
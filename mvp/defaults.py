@@ -0,0 +1,44 @@
+"""Defaults of the command-line options.
+
+Kept free of third-party imports so that parsing arguments (and --help) does
+not pay for importing the LLM and MCP stack; the modules implementing these
+options import their defaults from here.
+"""
+
+# LLM response cache (llm_cache.py)
+# read-through: serve hits, call the model and store on misses
+# record-only: always call the model and (over)write the entry
+# replay-only: serve hits, fail on misses without calling the model
+CACHE_MODES = ("read-through", "record-only", "replay-only")
+DEFAULT_CACHE_DIR = ".llm_cache"
+DEFAULT_MAX_SIZE_MB = 512
+DEFAULT_MAX_AGE_DAYS = 30
+
+# Event logs (event_log.py)
+DEFAULT_RUNS_DIR = "runs"
+
+# Profiling (profiling.py)
+DEFAULT_TRACE_FILE = "traces.jsonl"
+
+# Results database written by save_report (results_store.py)
+DEFAULT_RESULTS_DB = "results.db"
+
+# Tool catalog sharding (modes/catalog.py)
+DEFAULT_SHARD_SIZE = 40
+
+# Report validation (modes/validation.py)
+DEFAULT_MAX_REPAIRS = 2
+
+# Load testing (modes/stress.py)
+DEFAULT_CONCURRENCY = (1, 4, 16)
+DEFAULT_CALLS_PER_LEVEL = 50
+DEFAULT_STRESS_ARGUMENTS = "stress_arguments.json"
+
+# Models by role (model_roles.py) and the request scheduler in front of them (scheduler.py)
+DEFAULT_MODEL = "gpt-4o"
+MODEL_ROLES = ("planner", "scorer", "interviewer", "candidate")
+# Waiting calls are served lowest first: planning and scoring calls gate whole phases
+ROLE_PRIORITIES = {"planner": 0, "scorer": 0, "interviewer": 1, "candidate": 2}
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 60.0
@@ -0,0 +1,187 @@
+"""Append-only JSONL event log of an evaluation run, and resuming a run from it.
+
+Every model call (request key, response message, tokens, duration) and every
+tool call (arguments, result or error, duration) is appended to
+`<runs dir>/<run id>.jsonl` as it happens, bracketed by `run_started` and
+`run_completed`/`run_failed` events, so a long run can be followed with
+`tail -f`.
+
+Resuming re-runs the evaluation with the logged responses served again:
+agents rebuild the same memory step by step without paying for any call that
+already completed, and continue live from the first step that is not in the
+log. New events are appended to the same file.
+"""
+
+import datetime
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional
+
+from smolagents import Model, Tool, ToolCollection
+from smolagents.models import ChatMessage, get_dict_from_nested_dataclasses
+
+from defaults import DEFAULT_RUNS_DIR
+from llm_cache import cache_key
+from modes.base import ToolWrapper
+from wrappers import ModelWrapper
+
+
+def new_run_id() -> str:
+    return f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def run_log_path(runs_dir: str, run_id: str) -> str:
+    return os.path.join(runs_dir, f"{run_id}.jsonl")
+
+
+def _tool_call_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    return tool_name + ":" + json.dumps(arguments, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _jsonable(value: Any) -> Any:
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class RunLog:
+    """Thread-safe JSONL event writer that can also serve the calls of an earlier attempt."""
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.run_id = os.path.splitext(os.path.basename(path))[0]
+        self.started_event: Optional[Dict[str, Any]] = None
+        self._model_responses: Dict[str, deque] = defaultdict(deque)
+        self._tool_results: Dict[str, deque] = defaultdict(deque)
+        self._lock = threading.Lock()
+        self.stats = {"replayed_model_calls": 0, "replayed_tool_calls": 0}
+        if resume:
+            self._load()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Line buffered, so every event is on disk as soon as it is written
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"No event log for run '{self.run_id}' at {self.path}")
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # A line cut short by a crash
+                if event["type"] == "run_started" and self.started_event is None:
+                    self.started_event = event
+                elif event["type"] == "model_call":
+                    self._model_responses[event["key"]].append(event)
+                elif event["type"] == "tool_call" and "error" not in event:
+                    self._tool_results[_tool_call_key(event["tool"], event["arguments"])].append(event)
+        if self.started_event is None:
+            raise ValueError(f"Event log {self.path} has no run_started event")
+
+    def emit(self, event_type: str, **fields):
+        event = {"ts": round(time.time(), 3), "type": event_type, **fields}
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def take_model_response(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            queue = self._model_responses.get(key)
+            if not queue:
+                return None
+            self.stats["replayed_model_calls"] += 1
+            return queue.popleft()
+
+    def take_tool_result(self, tool_name: str, arguments: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            queue = self._tool_results.get(_tool_call_key(tool_name, arguments))
+            if not queue:
+                return None
+            self.stats["replayed_tool_calls"] += 1
+            return queue.popleft()
+
+    def wrap_model(self, model: Model) -> "LoggedModel":
+        return LoggedModel(model, self)
+
+    def wrap_tools(self, tool_collection: ToolCollection) -> ToolCollection:
+        return ToolCollection([LoggedTool(tool, self) for tool in tool_collection.tools])
+
+    def summary(self) -> Dict[str, Any]:
+        return {"run_id": self.run_id, "event_log": self.path, **self.stats}
+
+    def close(self):
+        self._file.close()
+
+
+class LoggedModel(ModelWrapper):
+    """Model wrapper that logs every call and serves calls already logged by an earlier attempt."""
+
+    def __init__(self, model: Model, run_log: RunLog):
+        super().__init__(model)
+        self.run_log = run_log
+
+    def __call__(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        key = cache_key(self.wrapped_model, messages, stop_sequences, grammar, tools_to_call_from, **kwargs)
+        logged = self.run_log.take_model_response(key)
+        if logged is not None:
+            self.last_input_token_count = 0
+            self.last_output_token_count = 0
+            return ChatMessage.from_dict(logged["message"])
+
+        started = time.perf_counter()
+        message = self.call_wrapped(
+            messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            **kwargs,
+        )
+        self.run_log.emit(
+            "model_call",
+            key=key,
+            duration=round(time.perf_counter() - started, 6),
+            input_tokens=self.last_input_token_count,
+            output_tokens=self.last_output_token_count,
+            message=get_dict_from_nested_dataclasses(message, ignore_key="raw"),
+        )
+        return message
+
+
+class LoggedTool(ToolWrapper):
+    """Tool wrapper that logs every call and serves results already logged by an earlier attempt."""
+
+    def __init__(self, tool: Tool, run_log: RunLog):
+        super().__init__(tool)
+        self.run_log = run_log
+
+    def forward(self, *args, **kwargs):
+        # Agents call tools with keyword arguments named after the tool inputs
+        arguments = dict(zip(self.inputs, args), **kwargs)
+        logged = self.run_log.take_tool_result(self.name, arguments)
+        if logged is not None:
+            return logged["result"]
+
+        started = time.perf_counter()
+        try:
+            result = super().forward(*args, **kwargs)
+        except Exception as e:
+            self.run_log.emit("tool_call", tool=self.name, arguments=arguments,
+                              duration=round(time.perf_counter() - started, 6), error=f"{type(e).__name__}: {e}")
+            raise
+        self.run_log.emit("tool_call", tool=self.name, arguments=arguments,
+                          duration=round(time.perf_counter() - started, 6), result=_jsonable(result))
+        return result
@@ -0,0 +1,92 @@
+"""Tool-schema fingerprints for incremental re-evaluation.
+
+Every report carries a fingerprint (sha256 over name, description, input
+schema and output type) of each tool it evaluated, under
+`metadata.tool_fingerprints`. Comparing them with the tools a server exposes
+now tells which tools were added, changed or removed since that report, so an
+incremental run only re-tests those and carries the rest forward.
+"""
+
+import glob
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+# Only needed for annotations, batch.py imports this module before anything needs smolagents
+if TYPE_CHECKING:
+    from smolagents import Tool
+
+FINGERPRINT_ALGORITHM = "sha256"
+
+
+def tool_fingerprint(tool: "Tool") -> str:
+    payload = {
+        "name": tool.name,
+        "description": tool.description,
+        "inputs": tool.inputs,
+        "output_type": tool.output_type,
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def fingerprint_tools(tools: List["Tool"], mode: str) -> Dict[str, Any]:
+    """Fingerprint metadata stored in a report, so a later run can diff against it."""
+    return {
+        "mode": mode,
+        "algorithm": FINGERPRINT_ALGORITHM,
+        "tools": {tool.name: tool_fingerprint(tool) for tool in tools},
+    }
+
+
+def diff_fingerprints(previous: Dict[str, str], current: Dict[str, str]) -> Dict[str, List[str]]:
+    """Classify tools by comparing two {tool name: fingerprint} maps."""
+    return {
+        "added": sorted(name for name in current if name not in previous),
+        "changed": sorted(name for name in current if name in previous and current[name] != previous[name]),
+        "removed": sorted(name for name in previous if name not in current),
+        "unchanged": sorted(name for name in current if previous.get(name) == current[name]),
+    }
+
+
+def load_previous_report(path: str, mode: str) -> Dict[str, Any]:
+    """Load a JSON report to diff against, checking it was produced by the same mode with fingerprints."""
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    fingerprints = report.get("metadata", {}).get("tool_fingerprints")
+    if not fingerprints:
+        raise ValueError(f"Report {path} has no tool fingerprints, run a full evaluation first")
+    if fingerprints.get("mode") != mode:
+        raise ValueError(f"Report {path} was produced by mode '{fingerprints.get('mode')}', not '{mode}'")
+    return report
+
+
+def latest_report(output_dir: str, mode: str) -> Optional[str]:
+    """Most recent JSON report of a mode in a directory, as written by save_report."""
+    # Timestamps in report names sort chronologically
+    reports = sorted(glob.glob(os.path.join(output_dir, f"{mode}_report_*.json")))
+    return reports[-1] if reports else None
+
+
+def incremental_diff(changes: Dict[str, List[str]], previous_scores: Dict[str, float],
+                     current_scores: Dict[str, float], carried_forward: int, re_evaluated: int) -> Dict[str, Any]:
+    """Diff section of an incremental report: tool changes, how much was re-run and how scores moved."""
+    score_deltas = {
+        name: {
+            "previous": previous_scores.get(name),
+            "current": current_scores.get(name),
+            "delta": (round(current_scores[name] - previous_scores[name], 4)
+                      if name in current_scores and name in previous_scores else None),
+        }
+        for name in sorted(set(previous_scores) | set(current_scores))
+    }
+    return {
+        "added": changes["added"],
+        "changed": changes["changed"],
+        "removed": changes["removed"],
+        "unchanged": len(changes["unchanged"]),
+        "carried_forward": carried_forward,
+        "re_evaluated": re_evaluated,
+        "score_deltas": score_deltas,
+    }
@@ -0,0 +1,201 @@
+"""Content-addressed, disk-backed cache for LLM responses.
+
+Entries are keyed by a SHA-256 over the model id and endpoint, the chat
+messages, the tool schemas offered to the model and the sampling parameters,
+and are stored as one JSON file per entry. Reads refresh the file's mtime,
+which drives LRU eviction once the store grows beyond its size budget; entries
+older than the age limit are dropped as well.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from smolagents import Model, Tool
+from smolagents.models import ChatMessage, get_dict_from_nested_dataclasses, get_tool_json_schema
+
+from defaults import CACHE_MODES, DEFAULT_CACHE_DIR, DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_SIZE_MB
+from wrappers import ModelWrapper
+
+
+class CacheMissError(RuntimeError):
+    """Raised in replay-only mode when a request has no cached response."""
+
+
+def cache_key(
+    model: Model,
+    messages: List[Dict[str, Any]],
+    stop_sequences: Optional[List[str]] = None,
+    grammar: Optional[str] = None,
+    tools_to_call_from: Optional[List[Tool]] = None,
+    **kwargs,
+) -> str:
+    """Compute the content address of a model request."""
+    material = {
+        "model_id": getattr(model, "model_id", type(model).__name__),
+        # Different endpoints may serve different models under the same id
+        "api_base": (getattr(model, "client_kwargs", None) or {}).get("base_url"),
+        "messages": messages,
+        "tools": [get_tool_json_schema(tool) for tool in tools_to_call_from or []],
+        "stop_sequences": stop_sequences,
+        "grammar": grammar,
+        # Sampling parameters configured on the model plus per-call overrides
+        "params": {**getattr(model, "kwargs", {}), **kwargs},
+    }
+    canonical = json.dumps(material, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """On-disk store of model responses with size/age-based LRU eviction."""
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_CACHE_DIR,
+        max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+        max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+    ):
+        self.directory = directory
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0,
+                      "saved_input_tokens": 0, "saved_output_tokens": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._sizes = self._scan()
+        self.evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _scan(self) -> Dict[str, int]:
+        sizes = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        sizes[path] = os.path.getsize(path)
+                    except OSError:
+                        pass
+        return sizes
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if time.time() - entry.get("created", 0) > self.max_age_seconds:
+            return None
+        # Refresh recency for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(entry, ensure_ascii=False, default=str)
+        # Write atomically so concurrent evaluations sharing the store never read partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._sizes[path] = len(data.encode("utf-8"))
+            self.stats["writes"] += 1
+            over_budget = sum(self._sizes.values()) > self.max_size_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under the size budget."""
+        with self._lock:
+            entries = []
+            for path in list(self._sizes):
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    self._sizes.pop(path, None)
+            now = time.time()
+            total = sum(self._sizes.values())
+            for mtime, path in sorted(entries):
+                if total <= self.max_size_bytes and now - mtime <= self.max_age_seconds:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= self._sizes.pop(path, 0)
+                self.stats["evictions"] += 1
+
+    def record(self, stat: str, amount: int = 1):
+        with self._lock:
+            self.stats[stat] += amount
+
+    def summary(self) -> Dict[str, Any]:
+        """Hit/miss statistics suitable for inclusion in a report."""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class CachedModel(ModelWrapper):
+    """Model wrapper that serves responses from an LLMCache."""
+
+    def __init__(self, model: Model, cache: LLMCache, mode: str = "read-through"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}")
+        super().__init__(model)
+        self.cache = cache
+        self.mode = mode
+
+    def __call__(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        key = cache_key(self.wrapped_model, messages, stop_sequences, grammar, tools_to_call_from, **kwargs)
+
+        if self.mode != "record-only":
+            entry = self.cache.get(key)
+            if entry is not None:
+                self.cache.record("hits")
+                self.cache.record("saved_input_tokens", entry.get("input_tokens") or 0)
+                self.cache.record("saved_output_tokens", entry.get("output_tokens") or 0)
+                # Nothing was spent on this call
+                self.last_input_token_count = 0
+                self.last_output_token_count = 0
+                return ChatMessage.from_dict(entry["message"])
+            self.cache.record("misses")
+            if self.mode == "replay-only":
+                raise CacheMissError(f"No cached response for request {key[:12]} in replay-only mode")
+
+        message = self.call_wrapped(
+            messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            **kwargs,
+        )
+        self.cache.put(key, {
+            "created": time.time(),
+            "model_id": getattr(self.wrapped_model, "model_id", None),
+            "input_tokens": self.last_input_token_count,
+            "output_tokens": self.last_output_token_count,
+            "message": get_dict_from_nested_dataclasses(message, ignore_key="raw"),
+        })
+        return message
@@ -0,0 +1,252 @@
+"""Record/replay transport for MCP tool sessions.
+
+In record mode the evaluator talks to the live server as usual while the MCP
+handshake (initialize result), the `tools/list` result and every `tools/call`
+request/response are captured into a compact session file. In replay mode the
+tools are rebuilt from that file and served by an in-process stand-in: no
+subprocess, no network, and (unless asked to replay recorded latencies) close
+to zero tool latency.
+
+Session files are JSON, gzip-compressed when the path ends with `.gz`.
+"""
+
+import asyncio
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import AsyncExitStack, contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import mcp
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.sse import sse_client
+from mcp.client.stdio import stdio_client
+from mcpadapt.core import MCPAdapt, ToolAdapter
+from mcpadapt.smolagents_adapter import SmolAgentsAdapter
+from smolagents import ToolCollection
+
+SESSION_FORMAT_VERSION = 1
+
+
+def _call_key(tool_name: str, arguments: Optional[Dict[str, Any]]) -> str:
+    return tool_name + ":" + json.dumps(arguments or {}, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def load_session(path: str) -> Dict[str, Any]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        session = json.load(f)
+    if session.get("version") != SESSION_FORMAT_VERSION:
+        raise ValueError(f"Unsupported session file version in {path}: {session.get('version')}")
+    return session
+
+
+class SessionRecorder:
+    """Collects the MCP traffic of one session and writes it to a session file."""
+
+    def __init__(self, path: str, server: Any = None):
+        self.path = path
+        self.server = server
+        self.initialize: Optional[Dict[str, Any]] = None
+        self.tools: List[Dict[str, Any]] = []
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record_handshake(self, initialize: mcp.types.InitializeResult, tools: List[mcp.types.Tool]):
+        self.initialize = initialize.model_dump(mode="json", exclude_none=True)
+        self.tools = [tool.model_dump(mode="json", exclude_none=True) for tool in tools]
+
+    def record_call(self, tool_name: str, arguments: Optional[Dict[str, Any]],
+                    result: Optional[mcp.types.CallToolResult], error: Optional[str], latency: float):
+        call = {"tool": tool_name, "arguments": arguments or {}, "latency": round(latency, 6)}
+        if result is not None:
+            call["result"] = result.model_dump(mode="json", exclude_none=True)
+        if error is not None:
+            call["error"] = error
+        with self._lock:
+            self.calls.append(call)
+
+    def save(self):
+        session = {
+            "version": SESSION_FORMAT_VERSION,
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "server": self.server,
+            "initialize": self.initialize,
+            "tools": self.tools,
+            "calls": self.calls,
+        }
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "wt", encoding="utf-8") as f:
+            json.dump(session, f, ensure_ascii=False, separators=(",", ":"))
+
+
+_last_call = threading.local()
+
+
+class _ErrorFlagAdapter(ToolAdapter):
+    """Adapter noting, per thread, whether a tool call came back as an isError result.
+
+    The smolagents adapter only hands back the result's text, so a failure the
+    server reports in-band looks like any other output to the caller.
+    """
+
+    def __init__(self, adapter: ToolAdapter):
+        self.adapter = adapter
+
+    def adapt(self, func: Callable[[dict | None], mcp.types.CallToolResult], mcp_tool: mcp.types.Tool) -> Any:
+        def flagged_call(arguments: dict | None = None) -> mcp.types.CallToolResult:
+            result = func(arguments)
+            _last_call.is_error = bool(result.isError)
+            return result
+
+        return self.adapter.adapt(flagged_call, mcp_tool)
+
+
+def tool_adapter() -> ToolAdapter:
+    """The adapter every MCP tool is built with: smolagents tools that flag isError results."""
+    return _ErrorFlagAdapter(SmolAgentsAdapter())
+
+
+def tool_call_failed() -> bool:
+    """Whether the last tool call made on this thread returned an isError result; resets the flag."""
+    failed = getattr(_last_call, "is_error", False)
+    _last_call.is_error = False
+    return failed
+
+
+class _RecordingAdapter(ToolAdapter):
+    """Adapter that times and records every tool call before handing it to the wrapped adapter."""
+
+    def __init__(self, adapter: ToolAdapter, recorder: SessionRecorder):
+        self.adapter = adapter
+        self.recorder = recorder
+
+    def adapt(self, func: Callable[[dict | None], mcp.types.CallToolResult], mcp_tool: mcp.types.Tool) -> Any:
+        def recorded_call(arguments: dict | None = None) -> mcp.types.CallToolResult:
+            started = time.perf_counter()
+            try:
+                result = func(arguments)
+            except Exception as e:
+                self.recorder.record_call(mcp_tool.name, arguments, None, f"{type(e).__name__}: {e}",
+                                          time.perf_counter() - started)
+                raise
+            self.recorder.record_call(mcp_tool.name, arguments, result, None, time.perf_counter() - started)
+            return result
+
+        return self.adapter.adapt(recorded_call, mcp_tool)
+
+
+class _RecordingMCPAdapt(MCPAdapt):
+    """MCPAdapt variant that also captures the initialize handshake and tools/list result."""
+
+    def __init__(self, serverparams: StdioServerParameters | Dict[str, Any], adapter: ToolAdapter,
+                 recorder: SessionRecorder):
+        super().__init__(serverparams, _RecordingAdapter(adapter, recorder))
+        self.recorder = recorder
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        serverparams = self.serverparams[0]
+
+        async def setup():
+            async with AsyncExitStack() as stack:
+                if isinstance(serverparams, StdioServerParameters):
+                    client = stdio_client(serverparams)
+                else:
+                    client = sse_client(**serverparams)
+                read, write = await stack.enter_async_context(client)
+                session = await stack.enter_async_context(ClientSession(read, write))
+                initialize = await session.initialize()
+                tools = (await session.list_tools()).tools
+                self.recorder.record_handshake(initialize, tools)
+                self.sessions, self.mcp_tools = [session], [tools]
+                self.ready.set()  # Signal initialization is complete
+                await asyncio.Event().wait()  # Keep session alive until stopped
+
+        self.task = self.loop.create_task(setup())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+
+
+class ReplayServer:
+    """In-process stand-in that answers tool calls from a recorded session.
+
+    Calls are matched on tool name + arguments. Repeated identical calls are
+    served in recording order, the last response being reused once exhausted.
+    """
+
+    def __init__(self, session: Dict[str, Any], replay_latency: bool = False):
+        self.session = session
+        self.replay_latency = replay_latency
+        self.tools = [mcp.types.Tool.model_validate(tool) for tool in session["tools"]]
+        self._responses: Dict[str, deque] = defaultdict(deque)
+        self._last: Dict[str, Dict[str, Any]] = {}
+        for call in session["calls"]:
+            self._responses[_call_key(call["tool"], call["arguments"])].append(call)
+        self._lock = threading.Lock()
+        self.stats = {"served": 0, "unmatched": 0}
+
+    def call_tool(self, tool_name: str, arguments: Optional[Dict[str, Any]] = None) -> mcp.types.CallToolResult:
+        key = _call_key(tool_name, arguments)
+        with self._lock:
+            queue = self._responses.get(key)
+            call = queue.popleft() if queue else self._last.get(key)
+            if call is not None:
+                self._last[key] = call
+            self.stats["served" if call is not None else "unmatched"] += 1
+
+        if call is None:
+            return mcp.types.CallToolResult(
+                content=[mcp.types.TextContent(
+                    type="text",
+                    text=f"Error: no recorded response for tool '{tool_name}' with these arguments",
+                )],
+                isError=True,
+            )
+        if self.replay_latency:
+            time.sleep(call.get("latency", 0))
+        if "error" in call:
+            raise RuntimeError(call["error"])
+        return mcp.types.CallToolResult.model_validate(call["result"])
+
+    def adapted_tools(self, adapter: ToolAdapter) -> List[Any]:
+        return [
+            adapter.adapt(lambda arguments=None, name=tool.name: self.call_tool(name, arguments), tool)
+            for tool in self.tools
+        ]
+
+
+@contextmanager
+def open_tool_collection(
+    server_parameters: Optional[StdioServerParameters | Dict[str, Any]],
+    record_session: Optional[str] = None,
+    replay_session: Optional[str] = None,
+    replay_latency: bool = False,
+) -> Iterator[ToolCollection]:
+    """Open the tools of an MCP server: live, live while recording, or replayed from a session file."""
+    if record_session and replay_session:
+        raise ValueError("Cannot record and replay a session at the same time")
+
+    if replay_session:
+        server = ReplayServer(load_session(replay_session), replay_latency=replay_latency)
+        yield ToolCollection(server.adapted_tools(tool_adapter()))
+    elif record_session:
+        server_info = (server_parameters.model_dump(mode="json", exclude={"env"})
+                       if isinstance(server_parameters, StdioServerParameters) else server_parameters)
+        recorder = SessionRecorder(record_session, server=server_info)
+        try:
+            with _RecordingMCPAdapt(server_parameters, tool_adapter(), recorder) as tools:
+                yield ToolCollection(tools)
+        finally:
+            # Keep whatever was captured, even if the evaluation failed half-way
+            if recorder.initialize is not None:
+                recorder.save()
+                print(f"MCP session recorded to {record_session} ({len(recorder.calls)} tool calls)")
+    else:
+        # What ToolCollection.from_mcp does, with the error-flagging adapter
+        with MCPAdapt(server_parameters, tool_adapter()) as tools:
+            yield ToolCollection(tools)
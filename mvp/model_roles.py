@@ -0,0 +1,96 @@
+"""The models of an evaluation by role, each on any OpenAI-compatible endpoint.
+
+    planner      plans the introspection tasks, derives the load-test calls
+    scorer       scores the introspection tasks, writes the interview summary
+    interviewer  extracts the declared capabilities, runs the sub-interviews
+    candidate    the agents calling the MCP tools
+
+Roles without a model of their own use the default model (--model). Every
+role's model is scheduled by the shared RequestScheduler (see scheduler.py).
+"""
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from defaults import DEFAULT_MAX_RETRIES, DEFAULT_MODEL, MODEL_ROLES
+
+if TYPE_CHECKING:
+    from smolagents import Model
+    from scheduler import SchedulerStats
+
+
+class ModelRoles:
+    """Maps each role to its model; roles not in the mapping get the default model."""
+
+    def __init__(self, roles: Dict[str, "Model"], default: Optional["Model"] = None):
+        self.roles = roles
+        self.default = default
+
+    @classmethod
+    def of(cls, model: "Model | ModelRoles") -> "ModelRoles":
+        """The given roles, or a single model playing every role."""
+        return model if isinstance(model, ModelRoles) else cls({}, default=model)
+
+    def __getitem__(self, role: str) -> "Model":
+        if role not in MODEL_ROLES:
+            raise KeyError(f"Unknown model role '{role}', expected one of {MODEL_ROLES}")
+        return self.roles.get(role, self.default)
+
+    def distinct(self) -> List["Model"]:
+        """Every model playing at least one role, once."""
+        models = {id(model): model for model in [*self.roles.values(), self.default] if model is not None}
+        return list(models.values())
+
+    def map(self, wrap: Callable[["Model"], "Model"]) -> "ModelRoles":
+        """Wrap every model once, a model playing several roles keeping a single wrapper."""
+        wrapped = {id(model): wrap(model) for model in self.distinct()}
+        return ModelRoles({role: wrapped[id(model)] for role, model in self.roles.items()},
+                          default=wrapped[id(self.default)] if self.default is not None else None)
+
+
+def parse_role_model(spec: str) -> tuple[str, Dict[str, str]]:
+    """Parse ROLE=MODEL_ID[@API_BASE], e.g. candidate=gpt-4o-mini or scorer=llama3@http://localhost:8000/v1.
+
+    Without API_BASE the role uses the default model's endpoint.
+    """
+    role, separator, model = spec.partition("=")
+    model_id, _, api_base = model.partition("@")
+    if not separator or role not in MODEL_ROLES or not model_id:
+        raise ValueError(f"Expected ROLE=MODEL_ID[@API_BASE] with ROLE one of {', '.join(MODEL_ROLES)}, got '{spec}'")
+    return role, {"model_id": model_id, **({"api_base": api_base} if api_base else {})}
+
+
+def describe_models(config: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Optional[str]]]:
+    """Model id and endpoint of every role, from a models configuration (see create_models)."""
+    config = config or {}
+    default = {"model_id": config.get("model") or DEFAULT_MODEL, "api_base": config.get("api_base")}
+    return {role: {**default, **(config.get("roles") or {}).get(role, {})} for role in MODEL_ROLES}
+
+
+def create_models(api_key: Optional[str], config: Optional[Dict[str, Any]], stats: "SchedulerStats") -> ModelRoles:
+    """Create the model of every role, behind the shared request scheduler.
+
+    config is e.g. {"model": "gpt-4o", "api_base": None, "roles": {"candidate": {"model_id": "gpt-4o-mini"}},
+    "rpm": 500, "tpm": 30000, "max_retries": 5}; rpm and tpm limit each endpoint.
+    Roles on the same model and endpoint share one client, and calls made
+    through them are recorded in stats.
+    """
+    from smolagents import OpenAIServerModel
+
+    from scheduler import RequestScheduler, ScheduledModel
+
+    config = config or {}
+    max_retries = DEFAULT_MAX_RETRIES if config.get("max_retries") is None else config["max_retries"]
+    scheduler = RequestScheduler.get()
+    clients: Dict[tuple, OpenAIServerModel] = {}
+    roles = {}
+    for role, model in describe_models(config).items():
+        # An endpoint is a base URL; None is OpenAI's default (or OPENAI_BASE_URL)
+        endpoint = model["api_base"] or "default"
+        scheduler.configure(endpoint, rpm=config.get("rpm"), tpm=config.get("tpm"))
+        key = (model["model_id"], model["api_base"])
+        if key not in clients:
+            # Retries are left to the scheduler, which backs off the whole endpoint
+            clients[key] = OpenAIServerModel(model_id=model["model_id"], api_base=model["api_base"], api_key=api_key,
+                                             client_kwargs={"max_retries": 0})
+        roles[role] = ScheduledModel(clients[key], role, endpoint, stats, max_retries=max_retries)
+    return ModelRoles(roles)
@@ -1,7 +1,15 @@
-from typing import Any, Dict, Protocol
+import contextvars
+import functools
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Protocol, Type
 
 from pydantic import BaseModel, Field
-from smolagents import OpenAIServerModel, ToolCollection
+from smolagents import OpenAIServerModel, Tool, ToolCollection
+from smolagents.models import MessageRole
 
 
 # Shared Capability Model
@@ -10,9 +18,129 @@ class Capability(BaseModel):
     description: str = Field(..., description="Detailed capability description")
 
 
+# Shared model for tool calls timed by the harness (not reported by the LLM)
+class ToolCallTiming(BaseModel):
+    tool: str = Field(..., description="Name of the tool that was called")
+    duration: float = Field(..., description="Measured call duration (seconds)")
+    success: bool = Field(..., description="Whether the call completed without raising")
+
+
 # Evaluation Mode Protocol
 class EvaluationMode(Protocol):
-    """Protocol defining the interface for an evaluation mode."""
+    """Protocol defining the interface for an evaluation mode.
+
+    model is either a single model playing every role or a model_roles.ModelRoles.
+    """
     def run(self, model: OpenAIServerModel, tool_collection: ToolCollection) -> Dict[str, Any]:
         """Runs the evaluation process and returns the result."""
-        ... 
\ No newline at end of file
+        ...
+
+    def run_incremental(self, model: OpenAIServerModel, tool_collection: ToolCollection,
+                        previous: Dict[str, Any], changes: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Re-evaluates only added/changed tools, carrying the rest forward from a previous result."""
+        ...
+
+
+class ToolWrapper(Tool):
+    """Base class for tools that add behaviour around another tool while keeping its interface."""
+
+    def __init__(self, tool: Tool):
+        self.tool = tool
+        self.name = tool.name
+        self.description = tool.description
+        self.inputs = tool.inputs
+        self.output_type = tool.output_type
+        self.is_initialized = True
+        self.skip_forward_signature_validation = True
+
+    def forward(self, *args, **kwargs):
+        return self.tool.forward(*args, **kwargs)
+
+
+class TimedTool(ToolWrapper):
+    """Tool wrapper that measures every call and reports it to a callback."""
+
+    def __init__(self, tool: Tool, on_call: Callable[[ToolCallTiming], None]):
+        super().__init__(tool)
+        self.on_call = on_call
+
+    def forward(self, *args, **kwargs):
+        started = time.perf_counter()
+        success = False
+        try:
+            result = super().forward(*args, **kwargs)
+            success = True
+            return result
+        finally:
+            self.on_call(ToolCallTiming(tool=self.name, duration=round(time.perf_counter() - started, 6), success=success))
+
+
+class ToolCallLog:
+    """Thread-safe collector of harness-measured tool call timings."""
+
+    def __init__(self):
+        self.calls: List[ToolCallTiming] = []
+        self._lock = threading.Lock()
+
+    def record(self, timing: ToolCallTiming):
+        with self._lock:
+            self.calls.append(timing)
+
+    def wrap(self, tools: List[Tool]) -> List[Tool]:
+        return [TimedTool(tool, self.record) for tool in tools]
+
+
+def describe_tools(tools: List[Tool], inputs: bool = True) -> str:
+    """Render tool names, descriptions and (unless inputs is False) input schemas for use in a prompt."""
+    return "\n".join(
+        f"- {tool.name}: {tool.description}"
+        + (f"\n  inputs: {json.dumps(tool.inputs, ensure_ascii=False)}" if inputs else "")
+        for tool in tools
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def json_schema(model_class: Type[BaseModel]) -> Dict[str, Any]:
+    """model_json_schema() of a pydantic model, generated once per process rather than once per mode instance.
+
+    Callers only format the schema into prompts; it must not be mutated.
+    """
+    model_class.model_rebuild()
+    return model_class.model_json_schema()
+
+
+def extract_json(text: str) -> Any:
+    """Parse a JSON value from an LLM reply, tolerating ```json fences and surrounding prose."""
+    text = text.strip()
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        start, end = text.find("{"), text.rfind("}")
+        if start != -1 and end > start:
+            return json.loads(text[start:end + 1])
+        raise
+
+
+def ask_json(model: OpenAIServerModel, prompt: str) -> Any:
+    """Send a single prompt to the model and parse its reply as JSON."""
+    message = model([{"role": MessageRole.USER, "content": [{"type": "text", "text": prompt}]}])
+    return extract_json(message.content or "")
+
+
+def elapsed_since(started: float, ndigits: int = 3) -> float:
+    """Seconds elapsed since a time.perf_counter() reading, rounded for reports."""
+    return round(time.perf_counter() - started, ndigits)
+
+
+def map_concurrently(func: Callable[[Any], Any], items: Iterable[Any], max_workers: int) -> List[Any]:
+    """ThreadPoolExecutor.map that runs every call in a copy of the caller's context.
+
+    Worker threads do not inherit context variables, so without this the
+    active trace span would be lost and their spans would start new traces.
+    """
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(lambda item: context.copy().run(func, item), items))
@@ -0,0 +1,118 @@
+"""Tool catalog: similarity index, bounded-size shards and retrieval over a server's tools.
+
+Aggregator servers expose hundreds of tools, whose schemas alone overflow an
+agent's context. The catalog turns every tool into a TF-IDF vector over the
+words of its name, description and input schema, groups similar tools into
+shards of at most `shard_size` tools (a capacity-bounded spherical k-means),
+and retrieves the tools most relevant to a piece of text, so that each agent
+only sees the tools that matter for its task.
+"""
+
+import json
+import math
+import re
+from collections import Counter
+from typing import Dict, List
+
+from smolagents import Tool
+
+from defaults import DEFAULT_SHARD_SIZE
+
+KMEANS_ITERATIONS = 10
+
+SparseVector = Dict[str, float]
+
+
+def tokenize(text: str) -> List[str]:
+    # Split snake_case and camelCase identifiers into words as well
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    return [word for word in re.split(r"[^a-z0-9]+", text.lower()) if len(word) > 1]
+
+
+def tool_document(tool: Tool) -> List[str]:
+    """Words describing a tool: its name, its description and its input names, types and descriptions."""
+    words = tokenize(tool.name) * 2 # The name is the strongest signal, weigh it twice
+    words += tokenize(tool.description or "")
+    for name, spec in (tool.inputs or {}).items():
+        words += tokenize(name)
+        words += tokenize(json.dumps(spec, ensure_ascii=False, default=str))
+    return words
+
+
+def _normalize(vector: SparseVector) -> SparseVector:
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    return {term: value / norm for term, value in vector.items()} if norm else vector
+
+
+def _dot(a: SparseVector, b: SparseVector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(term, 0.0) for term, value in a.items())
+
+
+class ToolCatalog:
+    """TF-IDF index of a tool collection, used to shard it and to retrieve relevant tools."""
+
+    def __init__(self, tools: List[Tool]):
+        self.tools = list(tools)
+        documents = [Counter(tool_document(tool)) for tool in self.tools]
+        document_frequency = Counter(term for document in documents for term in document)
+        count = len(documents)
+        self.idf = {term: math.log((1 + count) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        self.vectors = [self._vectorize(document) for document in documents]
+
+    def _vectorize(self, counts: Counter) -> SparseVector:
+        return _normalize({term: (1 + math.log(tf)) * self.idf[term] for term, tf in counts.items() if term in self.idf})
+
+    def search(self, text: str, limit: int) -> List[Tool]:
+        """The `limit` tools most similar to the text, most similar first."""
+        query = self._vectorize(Counter(tokenize(text)))
+        # sorted() is stable, so ties keep the server's tool order
+        ranked = sorted(range(len(self.tools)), key=lambda i: -_dot(query, self.vectors[i]))
+        return [self.tools[i] for i in ranked[:limit]]
+
+    def shards(self, shard_size: int = DEFAULT_SHARD_SIZE) -> List[List[Tool]]:
+        """Group similar tools into shards of at most shard_size tools (a single shard if all fit)."""
+        if len(self.tools) <= shard_size:
+            return [self.tools] if self.tools else []
+        k = math.ceil(len(self.tools) / shard_size)
+
+        # Deterministic farthest-point seeding, starting from the first tool
+        centroids = [self.vectors[0]]
+        closest = [_dot(vector, centroids[0]) for vector in self.vectors]
+        while len(centroids) < k:
+            index = min(range(len(self.vectors)), key=lambda i: closest[i])
+            centroids.append(self.vectors[index])
+            closest = [max(closest[i], _dot(self.vectors[i], self.vectors[index])) for i in range(len(self.vectors))]
+
+        assignment: List[int] = []
+        for _ in range(KMEANS_ITERATIONS):
+            new_assignment = self._assign(centroids, shard_size)
+            if new_assignment == assignment:
+                break
+            assignment = new_assignment
+            centroids = []
+            for shard in range(k):
+                total: SparseVector = {}
+                for index, assigned in enumerate(assignment):
+                    if assigned == shard:
+                        for term, value in self.vectors[index].items():
+                            total[term] = total.get(term, 0.0) + value
+                centroids.append(_normalize(total))
+
+        shards = [[tool for tool, assigned in zip(self.tools, assignment) if assigned == shard] for shard in range(k)]
+        return [shard for shard in shards if shard]
+
+    def _assign(self, centroids: List[SparseVector], capacity: int) -> List[int]:
+        """Assign every tool to its most similar centroid that still has room, most confident tools first."""
+        similarities = [[_dot(vector, centroid) for centroid in centroids] for vector in self.vectors]
+        order = sorted(range(len(self.vectors)), key=lambda i: -max(similarities[i]))
+        sizes = [0] * len(centroids)
+        assignment = [0] * len(self.vectors)
+        for index in order:
+            for shard in sorted(range(len(centroids)), key=lambda s: -similarities[index][s]):
+                if sizes[shard] < capacity:
+                    assignment[index] = shard
+                    sizes[shard] += 1
+                    break
+        return assignment
@@ -1,9 +1,18 @@
-from typing import Any, Dict, List
+import time
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field, field_validator
-from smolagents import CodeAgent, OpenAIServerModel, ToolCallingAgent, ToolCollection
+from smolagents import CodeAgent, OpenAIServerModel, Tool, ToolCallingAgent, ToolCollection
 
-from .base import Capability, EvaluationMode
+from defaults import DEFAULT_MAX_REPAIRS
+from fingerprint import incremental_diff
+from model_roles import ModelRoles
+from wrappers import TokenCounter
+
+from .base import (Capability, EvaluationMode, ToolCallLog, ToolCallTiming, describe_tools, elapsed_since, json_schema,
+                   map_concurrently)
+from .catalog import DEFAULT_SHARD_SIZE, ToolCatalog
+from .validation import SectionValidator
 
 
 # Define nested models outside the main class temporarily for schema generation
@@ -13,7 +22,48 @@ class _InterviewQuestion(BaseModel):
     answer: str = Field(..., description="Answer provided by the candidate")
 
 class _InterviewCapability(Capability): # Inherits from shared Capability
-    confidence: float = Field(..., description="Confidence score (0-1)")
+    confidence: float = Field(..., ge=0, le=1, description="Confidence score (0-1)")
+
+class _SubInterview(BaseModel):
+    capabilities: List[str] = Field(..., description="Declared capabilities covered by the sub-interview")
+    duration: float = Field(..., description="Wall time of the sub-interview (seconds)")
+    status: str = Field(..., description="'completed' or 'failed'")
+    error: Optional[str] = Field(None, description="Error message if the sub-interview failed")
+    tool_calls: List[ToolCallTiming] = Field(
+        default_factory=list,
+        description="Tool calls made by the candidate, timed by the harness"
+    )
+    question_ids: List[int] = Field(
+        default_factory=list,
+        description="Ids of the report's questions asked in this sub-interview"
+    )
+    scored_capabilities: List[str] = Field(
+        default_factory=list,
+        description="Names of the capabilities verified and scored in this sub-interview"
+    )
+
+class _InterviewIntakeModel(BaseModel):
+    declared_capabilities: List[_InterviewCapability] = Field(..., description="Capabilities the candidate claims to have")
+
+class _SubInterviewResultModel(BaseModel):
+    questions_and_answers: List[_InterviewQuestion] = Field(..., description="Interview questions and answers")
+    verified_capabilities: List[_InterviewCapability] = Field(..., description="Capabilities verified through testing")
+    capability_scores: Dict[str, float] = Field(
+        ...,
+        description="Capability scores, keys are capability names, values are scores between 0 and 1"
+    )
+
+    @field_validator('capability_scores')
+    @classmethod
+    def validate_scores(cls, v: Dict[str, float]) -> Dict[str, float]:
+        for key, value in v.items():
+            if not 0 <= value <= 1:
+                raise ValueError(f"Score for {key} must be between 0 and 1, got {value}")
+        return v
+
+class _InterviewSummaryModel(BaseModel):
+    candidate_overview: str = Field(..., description="Overview of the candidate's capabilities")
+    overall_assessment: str = Field(..., description="Overall assessment of the candidate")
 
 class _InterviewReportModel(BaseModel):
     candidate_overview: str = Field(..., description="Overview of the candidate's capabilities")
@@ -22,10 +72,14 @@ class _InterviewReportModel(BaseModel):
     questions_and_answers: List[_InterviewQuestion] = Field(..., description="Interview questions and answers")
     overall_assessment: str = Field(..., description="Overall assessment of the candidate")
     capability_scores: Dict[str, float] = Field(
-        ..., 
+        ...,
         description="Capability scores, keys are capability names, values are scores between 0 and 1"
     )
-    
+    sub_interviews: List[_SubInterview] = Field(
+        default_factory=list,
+        description="Per-capability sub-interviews and how long each took"
+    )
+
     @field_validator('capability_scores')
     @classmethod
     def validate_scores(cls, v: Dict[str, float]) -> Dict[str, float]:
@@ -36,7 +90,21 @@ class _InterviewReportModel(BaseModel):
 
 # Define the main mode class
 class InterviewMode(EvaluationMode):
-    """Implements the interview evaluation mode."""
+    """Implements the interview evaluation mode.
+
+    A short intake asks the candidate to introduce itself and extracts the
+    declared capabilities. Each capability (or cluster of capabilities) is then
+    probed in an independent sub-interview with its own interviewer and
+    candidate, run concurrently. A final merge step assembles the report.
+
+    Servers with more than `shard_size` tools are split into shards of similar
+    tools (see catalog.py): each shard gets its own intake, and the candidates
+    of its sub-interviews only see the tools of that shard.
+
+    The intake, every sub-interview result and the summary are validated as
+    they come in. A sub-interview whose result fails validation has only the
+    failing fields asked for again, instead of being lost (see validation.py).
+    """
 
     # Define nested models properly within the class scope for usage
     Question = _InterviewQuestion
@@ -46,62 +114,288 @@ class InterviewMode(EvaluationMode):
     # Store the report model class for schema generation later
     _ReportModel = _InterviewReportModel
 
-    INTERVIEW_PROMPT_TEMPLATE = """
-    You are a technical interviewer evaluating an AI agent candidate for a role that requires specific capabilities. 
-    Conduct a comprehensive interview to assess the candidate's capabilities and provide an evaluation based on their performance.
+    CANDIDATE_DESCRIPTION = "An AI candidate with specific capabilities provided by the available tools. When asked about capabilities, only describe what you can do with your available tools, not your general abilities(e.g. final_answer)."
+
+    INTAKE_QUESTION = "Please introduce yourself and describe in detail the capabilities you have with your available tools."
+
+    INTAKE_PROMPT_TEMPLATE = """
+    You are a technical interviewer evaluating an AI agent candidate. The candidate was asked to introduce itself and answered:
+
+    {Introduction}
+
+    The candidate has access to these tools:
+
+    {ToolDescriptions}
+
+    List the capabilities the candidate claims to have, with detailed descriptions and your confidence in each claim (0-1). Output only a JSON object (without the "```json" and "```" tags) following this schema:
+
+    {IntakeSchema}
+    """
+
+    SUB_INTERVIEW_PROMPT_TEMPLATE = """
+    You are a technical interviewer evaluating an AI agent candidate for a role that requires specific capabilities.
+    This part of the interview focuses only on the following capabilities declared by the candidate:
+
+    {Capabilities}
 
     Follow this interview process:
 
-    1. Ask the candidate to introduce themselves and describe their capabilities
-    2. Based on their introduction, ask specific questions to verify each capability they claim to have
-    3. Test their capabilities with practical tasks that would demonstrate their skills
-    4. Evaluate their performance on each capability
+    1. Ask specific questions to verify each of these capabilities
+    2. Test them with practical tasks that would demonstrate the candidate's skills
+    3. Evaluate the candidate's performance on each capability
 
-    Organize your evaluation into the following format:
+    Record each question you asked and the candidate's response, list the capabilities you've verified through testing with a score for each (0-1), and assign each capability a score between 0 and 1 that represents the candidate's proficiency.
 
-    ## Candidate Overview
-    [Provide an overview of the candidate based on their self-description and your assessment]
+    After completing all the steps above, use the final answer tool to output a complete JSON object (without the "```json" and "```" tags).
 
-    ## Declared Capabilities
-    [List capabilities the candidate claims to have, with detailed descriptions and your confidence in each claim (0-1)]
+    {SubInterviewSchema}
+    """
 
-    ## Verified Capabilities
-    [List capabilities you've verified through testing, with detailed descriptions and a score for each (0-1)]
+    MERGE_PROMPT_TEMPLATE = """
+    You are a technical interviewer concluding the evaluation of an AI agent candidate. Based on the interview below, write an overview of the candidate's capabilities and your overall assessment, including strengths, weaknesses, and suitability.
 
-    ## Questions and Answers
-    [List each question you asked and the candidate's response]
+    ## Declared Capabilities
+    {Declared}
 
-    ## Overall Assessment
-    [Provide your overall assessment of the candidate, including strengths, weaknesses, and suitability]
+    ## Questions and Answers
+    {Questions}
 
     ## Capability Scores
-    [For each capability, assign a score between 0 and 1 that represents their proficiency]
+    {Scores}
 
-    After completing all the steps above, use the final answer tool to output a complete JSON object (without the "```json" and "```" tags).
+    Output only a JSON object (without the "```json" and "```" tags) following this schema:
 
-    {InterviewReportSchema} # Placeholder for schema
+    {SummarySchema}
     """
-    
-    def __init__(self):
-        # Generate schema after the class is defined
-        InterviewMode._ReportModel.model_rebuild(force=True)
-        self.InterviewReportSchema = InterviewMode._ReportModel.model_json_schema()
-        self.INTERVIEW_PROMPT = self.INTERVIEW_PROMPT_TEMPLATE.format(InterviewReportSchema=self.InterviewReportSchema)
 
-    def run(self, model: OpenAIServerModel, tool_collection: ToolCollection) -> Dict[str, Any]:
-        candidate_agent = ToolCallingAgent(
-            tools=[*tool_collection.tools],
+    def __init__(self, max_workers: int = 4, capabilities_per_interview: int = 1,
+                 shard_size: int = DEFAULT_SHARD_SIZE, max_repairs: int = DEFAULT_MAX_REPAIRS):
+        self.max_workers = max_workers
+        self.capabilities_per_interview = capabilities_per_interview
+        self.shard_size = shard_size
+        self.validator = SectionValidator(max_repairs)
+        # Generate schemas after the classes are defined
+        self.InterviewReportSchema = json_schema(InterviewMode._ReportModel)
+        self.IntakeSchema = json_schema(_InterviewIntakeModel)
+        self.SubInterviewSchema = json_schema(_SubInterviewResultModel)
+        self.SummarySchema = json_schema(_InterviewSummaryModel)
+
+    def create_candidate(self, model: OpenAIServerModel, tools: List[Tool]) -> ToolCallingAgent:
+        return ToolCallingAgent(
+            tools=tools,
             model=model,
             add_base_tools=False,
             name="CandidateAgent",
-            description="An AI candidate with specific capabilities provided by the available tools. When asked about capabilities, only describe what you can do with your available tools, not your general abilities(e.g. final_answer)."
+            description=self.CANDIDATE_DESCRIPTION,
+        )
+
+    def intake(self, models: ModelRoles, tools: List[Tool]) -> tuple[str, List[_InterviewCapability]]:
+        introduction = str(self.create_candidate(models["candidate"], tools).run(self.INTAKE_QUESTION))
+        prompt = self.INTAKE_PROMPT_TEMPLATE.format(
+            Introduction=introduction,
+            ToolDescriptions=describe_tools(tools),
+            IntakeSchema=self.IntakeSchema,
         )
+        intake = self.validator.ask(models["interviewer"], prompt, _InterviewIntakeModel, "intake")
+        return introduction, intake.declared_capabilities
+
+    def sub_interview(self, models: ModelRoles, tools: List[Tool],
+                      capabilities: List[_InterviewCapability]) -> tuple[_SubInterview, Optional[_SubInterviewResultModel]]:
+        call_log = ToolCallLog()
+        # Counts what the sub-interview costs, to set repairing its result against running it again
+        counters = ModelRoles({role: models[role] for role in ("interviewer", "candidate")}).map(TokenCounter)
+        candidate_agent = self.create_candidate(counters["candidate"], call_log.wrap(tools))
         interviewer_agent = CodeAgent(
-            tools=[], 
-            model=model, 
+            tools=[],
+            model=counters["interviewer"],
             add_base_tools=True, # Interviewer can use base tools like final_answer
             managed_agents=[candidate_agent]
         )
-        # Use the formatted prompt from __init__
-        result = interviewer_agent.run(self.INTERVIEW_PROMPT) 
-        return result 
\ No newline at end of file
+        prompt = self.SUB_INTERVIEW_PROMPT_TEMPLATE.format(
+            Capabilities="\n".join(f"- {c.name}: {c.description}" for c in capabilities),
+            SubInterviewSchema=self.SubInterviewSchema,
+        )
+        started = time.perf_counter()
+        result, error = None, None
+        try:
+            answer = interviewer_agent.run(prompt)
+            rerun = {"input_tokens": sum(counter.input_tokens for counter in counters.distinct()),
+                     "output_tokens": sum(counter.output_tokens for counter in counters.distinct()),
+                     "time": elapsed_since(started)}
+            result = self.validator.check(models["interviewer"], prompt, answer, _SubInterviewResultModel,
+                                          "sub_interview", rerun)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        timing = _SubInterview(
+            capabilities=[c.name for c in capabilities],
+            duration=elapsed_since(started),
+            status="completed" if result is not None else "failed",
+            error=error,
+            tool_calls=call_log.calls,
+        )
+        return timing, result
+
+    def merge(self, model: OpenAIServerModel, introduction: str, declared: List[_InterviewCapability],
+              sub_interviews: List[tuple[_SubInterview, Optional[_SubInterviewResultModel]]]) -> _InterviewReportModel:
+        questions = [_InterviewQuestion(id=1, question=self.INTAKE_QUESTION, answer=introduction)]
+        verified, scores, timings = [], {}, []
+        for timing, result in sub_interviews:
+            if result is None:
+                timings.append(timing)
+                continue
+            # Question ids are only unique within a sub-interview, renumber them globally
+            first_id = len(questions) + 1
+            questions.extend(
+                _InterviewQuestion(id=first_id + i, question=q.question, answer=q.answer)
+                for i, q in enumerate(result.questions_and_answers)
+            )
+            verified.extend(result.verified_capabilities)
+            scores.update(result.capability_scores)
+            # Remember what came out of the sub-interview so an incremental run can carry it forward
+            timings.append(timing.model_copy(update={
+                "question_ids": list(range(first_id, len(questions) + 1)),
+                "scored_capabilities": sorted({c.name for c in result.verified_capabilities} | set(result.capability_scores)),
+            }))
+
+        prompt = self.MERGE_PROMPT_TEMPLATE.format(
+            Declared="\n".join(c.model_dump_json() for c in declared),
+            Questions="\n".join(q.model_dump_json() for q in questions),
+            Scores=scores,
+            SummarySchema=self.SummarySchema,
+        )
+        summary = self.validator.ask(model, prompt, _InterviewSummaryModel, "summary")
+        return InterviewMode._ReportModel(
+            candidate_overview=summary.candidate_overview,
+            declared_capabilities=declared,
+            verified_capabilities=verified,
+            questions_and_answers=questions,
+            overall_assessment=summary.overall_assessment,
+            capability_scores=scores,
+            sub_interviews=timings,
+        )
+
+    def run_sub_interviews(self, models: ModelRoles,
+                           groups: List[tuple[List[Tool], List[_InterviewCapability]]]
+                           ) -> List[tuple[_SubInterview, Optional[_SubInterviewResultModel]]]:
+        """Sub-interview every group's capabilities, with a candidate that only sees the group's tools."""
+        size = max(1, self.capabilities_per_interview)
+        clusters = [(tools, declared[i:i + size]) for tools, declared in groups for i in range(0, len(declared), size)]
+        # Every sub-interview has its own candidate, so they are independent and can run side by side
+        return map_concurrently(lambda cluster: self.sub_interview(models, *cluster), clusters, self.max_workers)
+
+    def shard_intakes(self, models: ModelRoles, shards: List[List[Tool]]
+                      ) -> tuple[str, List[tuple[List[Tool], List[_InterviewCapability]]]]:
+        """Run one intake per shard, making capability names unique across shards."""
+        intakes = map_concurrently(lambda shard: self.intake(models, shard), shards, self.max_workers)
+        groups, names = [], set()
+        for shard, (_, declared) in zip(shards, intakes):
+            unique = []
+            for capability in declared:
+                name, suffix = capability.name, 2
+                while name in names:
+                    name, suffix = f"{capability.name} ({suffix})", suffix + 1
+                names.add(name)
+                unique.append(capability.model_copy(update={"name": name}))
+            groups.append((shard, unique))
+        return "\n\n".join(introduction for introduction, _ in intakes), groups
+
+    def run(self, model: OpenAIServerModel, tool_collection: ToolCollection) -> Dict[str, Any]:
+        tools = [*tool_collection.tools]
+        shards = ToolCatalog(tools).shards(self.shard_size) or [tools]
+        # Section repairs are set against what the whole evaluation cost
+        models, run_started = ModelRoles.of(model).map(TokenCounter), time.perf_counter()
+        phases = {}
+
+        started = time.perf_counter()
+        introduction, groups = self.shard_intakes(models, shards)
+        declared = [capability for _, shard_declared in groups for capability in shard_declared]
+        phases["intake"] = elapsed_since(started)
+
+        started = time.perf_counter()
+        sub_interviews = self.run_sub_interviews(models, groups)
+        phases["sub_interviews"] = elapsed_since(started)
+
+        started = time.perf_counter()
+        report = self.merge(models["scorer"], introduction, declared, sub_interviews)
+        phases["merge"] = elapsed_since(started)
+
+        result = report.model_dump()
+        result["metadata"] = {"phase_timings": phases, "max_workers": self.max_workers,
+                              "validation": self.validator.summary(models.distinct(), elapsed_since(run_started))}
+        if len(shards) > 1:
+            result["metadata"]["shards"] = [
+                {"tools": [tool.name for tool in shard], "capabilities": [c.name for c in shard_declared]}
+                for shard, shard_declared in groups
+            ]
+        return result
+
+    def run_incremental(self, model: OpenAIServerModel, tool_collection: ToolCollection,
+                        previous: Dict[str, Any], changes: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Interview only about added or changed tools, carrying everything else forward from the previous report.
+
+        Completed sub-interviews are carried forward, with their questions and
+        scores, unless the candidate called a changed or removed tool in them.
+        A previous report without sub-interviews, or whose sub-interviews did not
+        record their tool calls, is fully re-evaluated instead.
+        The intake and new sub-interviews only see the added and changed tools.
+        """
+        stale = set(changes["changed"]) | set(changes["removed"])
+        retest = set(changes["added"]) | set(changes["changed"])
+        # Without sub-interviews nothing can be carried forward, and sub-interviews that did not
+        # record their tool calls cannot be told apart from ones calling no tool
+        previous_sub_interviews = previous.get("sub_interviews")
+        if (previous_sub_interviews is None and (stale or retest)) or (stale and any(
+                timing.get("status") == "completed" and "tool_calls" not in timing
+                for timing in previous_sub_interviews or [])):
+            print("Previous report does not record which tools its sub-interviews called; re-evaluating all tools")
+            return self.run(model, tool_collection)
+        tools = [*tool_collection.tools]
+        previous_report = InterviewMode._ReportModel.model_validate(previous)
+        models, run_started = ModelRoles.of(model).map(TokenCounter), time.perf_counter()
+        if not stale and not retest:
+            result = previous_report.model_dump()
+            result["incremental_diff"] = incremental_diff(
+                changes, previous_report.capability_scores, previous_report.capability_scores,
+                carried_forward=len(previous_report.sub_interviews), re_evaluated=0)
+            result["metadata"] = {"phase_timings": {}, "max_workers": self.max_workers,
+                                  "validation": self.validator.summary(models.distinct(), elapsed_since(run_started))}
+            return result
+
+        questions = {q.id: q for q in previous_report.questions_and_answers}
+        carried = []
+        for timing in previous_report.sub_interviews:
+            if timing.status != "completed" or stale & {call.tool for call in timing.tool_calls}:
+                continue
+            names = set(timing.scored_capabilities)
+            carried.append((timing, _SubInterviewResultModel(
+                questions_and_answers=[questions[i] for i in timing.question_ids if i in questions],
+                verified_capabilities=[c for c in previous_report.verified_capabilities if c.name in names],
+                capability_scores={k: v for k, v in previous_report.capability_scores.items() if k in names},
+            )))
+        carried_names = {name for timing, _ in carried for name in timing.capabilities}
+        declared = [c for c in previous_report.declared_capabilities if c.name in carried_names]
+        introduction = previous_report.questions_and_answers[0].answer if previous_report.questions_and_answers else ""
+        phases = {}
+
+        new_sub_interviews = []
+        if retest:
+            retest_tools = [tool for tool in tools if tool.name in retest]
+            started = time.perf_counter()
+            introduction, new_declared = self.intake(models, retest_tools)
+            phases["intake"] = elapsed_since(started)
+
+            started = time.perf_counter()
+            new_sub_interviews = self.run_sub_interviews(models, [(retest_tools, new_declared)])
+            phases["sub_interviews"] = elapsed_since(started)
+            declared = declared + new_declared
+
+        started = time.perf_counter()
+        report = self.merge(models["scorer"], introduction, declared, carried + new_sub_interviews)
+        phases["merge"] = elapsed_since(started)
+
+        result = report.model_dump()
+        result["incremental_diff"] = incremental_diff(changes, previous_report.capability_scores, report.capability_scores,
+                                                      carried_forward=len(carried), re_evaluated=len(new_sub_interviews))
+        result["metadata"] = {"phase_timings": phases, "max_workers": self.max_workers,
+                              "validation": self.validator.summary(models.distinct(), elapsed_since(run_started))}
+        return result
@@ -1,32 +1,85 @@
-from typing import Any, Dict, List, Union
+import time
+from typing import Any, Dict, List, Optional, Union
 
-from pydantic import BaseModel, Field, field_validator
-from smolagents import CodeAgent, OpenAIServerModel, ToolCollection
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
+from smolagents import OpenAIServerModel, Tool, ToolCallingAgent, ToolCollection
 
-from .base import Capability, EvaluationMode
+from defaults import DEFAULT_MAX_REPAIRS
+from fingerprint import incremental_diff
+from model_roles import ModelRoles
+from wrappers import TokenCounter
+
+from .base import (Capability, EvaluationMode, ToolCallLog, ToolCallTiming, describe_tools, elapsed_since, json_schema,
+                   map_concurrently)
+from .catalog import DEFAULT_SHARD_SIZE, ToolCatalog
+from .validation import SectionValidator
 
 
 # Define nested models outside the main class temporarily for schema generation
+class _IntrospectionCapability(Capability): # Inherits from shared Capability
+    tools: List[str] = Field(default_factory=list, description="Names of the tools providing the capability")
+
 class _IntrospectionEvaluationMetric(BaseModel):
     name: str = Field(..., description="Evaluation metric name")
     description: str = Field(..., description="Detailed evaluation metric description")
 
+class _IntrospectionPlannedTask(BaseModel):
+    id: int = Field(..., description="Task ID")
+    description: str = Field(..., description="Task description, including the concrete inputs to use")
+    tools: List[str] = Field(default_factory=list, description="Names of the tools the task exercises")
+
 class _IntrospectionEvaluationTask(BaseModel):
     id: int = Field(..., description="Task ID")
     description: str = Field(..., description="Task description")
     execution_result: Union[str, Dict[str, Any]] = Field(..., description="Execution result")
     execution_time: float = Field(..., description="Execution time (seconds)")
+    tool_calls: List[ToolCallTiming] = Field(
+        default_factory=list,
+        description="Tool calls made while executing the task, timed by the harness"
+    )
+
+class _IntrospectionPlanModel(BaseModel):
+    capability_overview: str = Field(..., description="Capability overview")
+    capability_list: List[_IntrospectionCapability] = Field(..., description="Capability list")
+    evaluation_metrics: List[_IntrospectionEvaluationMetric] = Field(..., description="Evaluation metrics list")
+    evaluation_tasks: List[_IntrospectionPlannedTask] = Field(..., description="Evaluation tasks to execute")
+
+class _IntrospectionMetricsModel(BaseModel):
+    evaluation_metrics: List[_IntrospectionEvaluationMetric] = Field(..., description="Evaluation metrics list")
+
+class _IntrospectionShardPlanModel(BaseModel):
+    capability_overview: str = Field(..., description="Capability overview")
+    capability_list: List[_IntrospectionCapability] = Field(..., description="Capability list")
+    evaluation_tasks: List[_IntrospectionPlannedTask] = Field(..., description="Evaluation tasks to execute")
+
+class _IntrospectionScoresModel(BaseModel):
+    final_metric_scores: Dict[str, float] = Field(
+        ...,
+        description="Final metric scores, keys are metric names, values are corresponding scores (0-1)"
+    )
+
+    @field_validator('final_metric_scores')
+    @classmethod
+    def validate_scores(cls, v: Dict[str, float], info: ValidationInfo) -> Dict[str, float]:
+        for key, value in v.items():
+            if not 0 <= value <= 1:
+                raise ValueError(f"Score for {key} must be between 0 and 1, got {value}")
+        # The metrics being scored are passed as validation context
+        missing = [name for name in (info.context or {}).get("metrics", []) if name not in v]
+        if missing:
+            raise ValueError(f"Missing scores for metrics: {', '.join(missing)}")
+        return v
 
 class _CapabilityReportModel(BaseModel):
     capability_overview: str = Field(..., description="Capability overview")
-    capability_list: List[Capability] = Field(..., description="Capability list")
+    capability_list: List[_IntrospectionCapability] = Field(..., description="Capability list")
     evaluation_metrics: List[_IntrospectionEvaluationMetric] = Field(..., description="Evaluation metrics list")
     evaluation_tasks: List[_IntrospectionEvaluationTask] = Field(..., description="Evaluation tasks list")
     final_metric_scores: Dict[str, float] = Field(
-        ..., 
+        ...,
         description="Final metric scores, keys are metric names, values are corresponding scores (0-1)"
     )
-    
+
     @field_validator('final_metric_scores')
     @classmethod
     def validate_scores(cls, v: Dict[str, float]) -> Dict[str, float]:
@@ -37,56 +90,328 @@ class _CapabilityReportModel(BaseModel):
 
 # Define the main mode class
 class IntrospectionMode(EvaluationMode):
-    """Implements the self-evaluation (introspection) mode."""
-    
+    """Implements the self-evaluation (introspection) mode.
+
+    The evaluation runs in three phases: a single planning call designs the
+    capabilities, metrics and tasks; the tasks are then executed concurrently,
+    each by its own tool-calling agent whose tool calls are timed by the
+    harness; finally a scoring call turns the results into metric scores.
+
+    Servers with more than `shard_size` tools are split into shards of similar
+    tools (see catalog.py). The metrics are planned once, from the names and
+    descriptions of all tools; each shard then gets capabilities and tasks of
+    its own, planned against those metrics. The tasks of every shard share one
+    pool of max_workers agents, and the shard results are merged into one
+    report.
+
+    The plan and the scores are validated as soon as they come back, and only
+    their failing fields are asked for again (see validation.py).
+    """
+
     # Define nested models properly within the class scope for usage
     EvaluationMetric = _IntrospectionEvaluationMetric
     EvaluationTask = _IntrospectionEvaluationTask
     CapabilityReportModel = _CapabilityReportModel
 
     # Store the report model class for schema generation later
-    _ReportModel = _CapabilityReportModel 
+    _ReportModel = _CapabilityReportModel
 
-    INTROSPECT_PROMPT_TEMPLATE = """
-    Please create a detailed list describing the capabilities of your tools (excluding the final answer tool).
-    Then, identify 6 evaluation metrics for yourself and define each one. These metrics should reflect how well you can perform the capabilities you've declared.
+    PLAN_PROMPT_TEMPLATE = """
+    You are evaluating the capabilities of an MCP server through the tools it provides. The tools are:
 
-    Next, design a set of tasks (specific, executable, with the number flexibly chosen based on the number of tools) that comprehensively cover these capabilities. These tasks should test the capabilities you've just listed and, through their execution results, allow you to derive quantified values for your evaluation metrics.
+    {ToolDescriptions}
 
-    Organize these elements into a document with the following format:
+    Please create a detailed list describing the capabilities of these tools, naming the tools that provide each capability.
+    Then, identify 6 evaluation metrics and define each one. These metrics should reflect how well the declared capabilities can be performed. Each metric should be normalized to between 0 and 1.
 
-    ## Capability Overview
-    [Provide an overview of the capabilities of your tools.]
+    Next, design a set of tasks (specific, executable, with the number flexibly chosen based on the number of tools) that comprehensively cover these capabilities. Each task must be executable on its own, independently of the other tasks, and its description must contain the concrete inputs to use. List the names of the tools each task exercises.
 
-    ## Capability List
-    [List in detail the capabilities of your tools, excluding the final_answer tool.]
+    Output only a JSON object (without the "```json" and "```" tags) following this schema:
 
-    ## Evaluation Metrics
-    [Define 6 evaluation metrics and provide a definition for each. These metrics should be closely related to the user's focus areas. Each metric should be normalized to between 0 and 1.]
+    {PlanSchema}
+    """
+
+    METRICS_PROMPT_TEMPLATE = """
+    You are evaluating the capabilities of an MCP server through the tools it provides. The tools are:
+
+    {ToolDescriptions}
+
+    Identify 6 evaluation metrics and define each one. These metrics should reflect how well the capabilities of these tools can be performed. Each metric should be normalized to between 0 and 1.
+
+    Output only a JSON object (without the "```json" and "```" tags) following this schema:
+
+    {MetricsSchema}
+    """
+
+    SHARD_PLAN_PROMPT_TEMPLATE = """
+    You are evaluating the capabilities of an MCP server through the tools it provides. The server is evaluated in groups of similar tools; the tools of this group are:
+
+    {ToolDescriptions}
 
-    ## Evaluation Task
-    [Design a set of tasks that comprehensively cover your capabilities. The number can be flexible based on the number of tools and user focus areas. These tasks should test the capabilities you've declared and, through their execution results, allow you to derive quantified values for the above metrics. You need to design specific inputs and outputs according to the tool requirements, execute these tasks one by one, and record the execution results of each task.]
+    Please create a detailed list describing the capabilities of these tools, naming the tools that provide each capability.
 
-    ## Final Metric Scores
-    [Based on the execution results of the above tasks, provide quantified values for each evaluation metric.]
+    The server is scored on the following evaluation metrics, defined for all of its tools:
+    {Metrics}
 
-    After completing all the steps above, use the final answer tool to output a complete JSON object (without the "```json" and "```" tags).
+    Next, design a set of tasks (specific, executable, with the number flexibly chosen based on the number of tools) that comprehensively cover these capabilities and show how well they do on these metrics. Each task must be executable on its own, independently of the other tasks, and its description must contain the concrete inputs to use. List the names of the tools each task exercises.
 
-    {CapabilityReportSchema} # Placeholder for schema
+    Output only a JSON object (without the "```json" and "```" tags) following this schema:
+
+    {PlanSchema}
+    """
+
+    TASK_PROMPT_TEMPLATE = """
+    Execute the following evaluation task using the available tools, then use the final answer tool to report the execution result: what you called, what came back, and whether the task succeeded.
+
+    Task #{id}: {description}
+    """
+
+    SCORE_PROMPT_TEMPLATE = """
+    You are scoring an MCP server against the evaluation metrics below, based on the results of executing the evaluation tasks.
+
+    ## Evaluation Metrics
+    {Metrics}
+
+    ## Evaluation Tasks and Results
+    {Tasks}
+
+    Based on the execution results, provide a quantified value between 0 and 1 for each evaluation metric. Output only a JSON object (without the "```json" and "```" tags) following this schema:
+
+    {ScoresSchema}
     """
 
-    def __init__(self):
-        # Generate schema after the class is defined
-        IntrospectionMode._ReportModel.model_rebuild(force=True)
-        self.CapabilityReportSchema = IntrospectionMode._ReportModel.model_json_schema()
-        self.INTROSPECT_PROMPT = self.INTROSPECT_PROMPT_TEMPLATE.format(CapabilityReportSchema=self.CapabilityReportSchema)
+    def __init__(self, max_workers: int = 4, task_max_steps: int = 8, shard_size: int = DEFAULT_SHARD_SIZE,
+                 max_repairs: int = DEFAULT_MAX_REPAIRS):
+        self.max_workers = max_workers
+        self.task_max_steps = task_max_steps
+        self.shard_size = shard_size
+        self.validator = SectionValidator(max_repairs)
+        # Generate schemas after the classes are defined
+        self.CapabilityReportSchema = json_schema(IntrospectionMode._ReportModel)
+        self.PlanSchema = json_schema(_IntrospectionPlanModel)
+        self.MetricsSchema = json_schema(_IntrospectionMetricsModel)
+        self.ShardPlanSchema = json_schema(_IntrospectionShardPlanModel)
+        self.ScoresSchema = json_schema(_IntrospectionScoresModel)
+
+    def plan(self, model: OpenAIServerModel, tools: List[Tool],
+             metrics: Optional[List[_IntrospectionEvaluationMetric]] = None) -> _IntrospectionPlanModel:
+        """Plan capabilities, metrics and tasks for the tools, or capabilities and tasks against given metrics."""
+        if metrics is None:
+            prompt = self.PLAN_PROMPT_TEMPLATE.format(ToolDescriptions=describe_tools(tools), PlanSchema=self.PlanSchema)
+            return self.validator.ask(model, prompt, _IntrospectionPlanModel, "plan")
+        prompt = self.SHARD_PLAN_PROMPT_TEMPLATE.format(
+            ToolDescriptions=describe_tools(tools),
+            Metrics="\n".join(f"- {m.name}: {m.description}" for m in metrics),
+            PlanSchema=self.ShardPlanSchema,
+        )
+        plan = self.validator.ask(model, prompt, _IntrospectionShardPlanModel, "plan")
+        return _IntrospectionPlanModel(**dict(plan), evaluation_metrics=metrics)
+
+    def plan_metrics(self, model: OpenAIServerModel, tools: List[Tool]) -> List[_IntrospectionEvaluationMetric]:
+        # Input schemas are left out, so that even a large catalog fits in one prompt
+        prompt = self.METRICS_PROMPT_TEMPLATE.format(ToolDescriptions=describe_tools(tools, inputs=False),
+                                                     MetricsSchema=self.MetricsSchema)
+        return self.validator.ask(model, prompt, _IntrospectionMetricsModel, "metrics").evaluation_metrics
+
+    def execute_task(self, model: OpenAIServerModel, catalog: ToolCatalog,
+                     task: _IntrospectionPlannedTask) -> _IntrospectionEvaluationTask:
+        call_log = ToolCallLog()
+        # Only hand the agent the tools the task exercises, or those closest to its description
+        # when the plan names none we know
+        task_tools = ([tool for tool in catalog.tools if tool.name in task.tools]
+                      or catalog.search(task.description, self.shard_size))
+        agent = ToolCallingAgent(
+            tools=call_log.wrap(task_tools),
+            model=model,
+            add_base_tools=False,
+            max_steps=self.task_max_steps,
+        )
+        started = time.perf_counter()
+        try:
+            result = agent.run(self.TASK_PROMPT_TEMPLATE.format(id=task.id, description=task.description))
+        except Exception as e:
+            result = f"Task failed: {type(e).__name__}: {e}"
+        if not isinstance(result, (str, dict)):
+            result = str(result)
+        return _IntrospectionEvaluationTask(
+            id=task.id,
+            description=task.description,
+            execution_result=result,
+            execution_time=elapsed_since(started),
+            tool_calls=call_log.calls,
+        )
+
+    def execute_tasks(self, model: OpenAIServerModel, catalog: ToolCatalog,
+                      planned: List[_IntrospectionPlannedTask]) -> List[_IntrospectionEvaluationTask]:
+        # Tool calls go through the MCP client's own event loop, so tasks can share the tools across threads
+        return map_concurrently(lambda task: self.execute_task(model, catalog, task), planned, self.max_workers)
+
+    def score(self, model: OpenAIServerModel, metrics: List[_IntrospectionEvaluationMetric],
+              tasks: List[_IntrospectionEvaluationTask]) -> Dict[str, float]:
+        prompt = self.SCORE_PROMPT_TEMPLATE.format(
+            Metrics="\n".join(f"- {m.name}: {m.description}" for m in metrics),
+            Tasks="\n".join(task.model_dump_json(exclude={"tool_calls"}) for task in tasks),
+            ScoresSchema=self.ScoresSchema,
+        )
+        return self.validator.ask(model, prompt, _IntrospectionScoresModel, "scores",
+                                  context={"metrics": [m.name for m in metrics]}).final_metric_scores
+
+    def run_sharded(self, models: ModelRoles, shards: List[List[Tool]]) -> Dict[str, Any]:
+        phases = {}
+
+        started = time.perf_counter()
+        metrics = self.plan_metrics(models["planner"], [tool for shard in shards for tool in shard])
+        plans = map_concurrently(lambda shard: self.plan(models["planner"], shard, metrics), shards, self.max_workers)
+        phases["planning"] = elapsed_since(started)
+
+        started = time.perf_counter()
+        # The tasks of all shards go through one pool, so no more than max_workers agents run at once
+        catalogs = [ToolCatalog(shard) for shard in shards]
+        planned = [(index, task) for index, plan in enumerate(plans) for task in plan.evaluation_tasks]
+        executed = map_concurrently(lambda item: self.execute_task(models["candidate"], catalogs[item[0]], item[1]),
+                                    planned, self.max_workers)
+        shard_runs = [(plan, []) for plan in plans]
+        for (index, _), task in zip(planned, executed):
+            shard_runs[index][1].append(task)
+        phases["execution"] = elapsed_since(started)
+
+        started = time.perf_counter()
+        shard_scores = map_concurrently(lambda shard_run: self.score(models["scorer"], metrics, shard_run[1]),
+                                        shard_runs, self.max_workers)
+        phases["scoring"] = elapsed_since(started)
+
+        capabilities, tasks, scores, weights, shard_task_ids = {}, [], {}, {}, []
+        for (plan, shard_tasks), shard_score in zip(shard_runs, shard_scores):
+            for capability in plan.capability_list:
+                capabilities.setdefault(capability.name, capability)
+            # Task ids are only unique within a shard, renumber them globally
+            first_id = len(tasks) + 1
+            tasks.extend(task.model_copy(update={"id": first_id + i}) for i, task in enumerate(shard_tasks))
+            shard_task_ids.append(list(range(first_id, len(tasks) + 1)))
+            # Shard scores are averaged, weighted by how many tasks back them
+            for name, value in shard_score.items():
+                scores[name] = scores.get(name, 0.0) + value * len(shard_tasks)
+                weights[name] = weights.get(name, 0) + len(shard_tasks)
+
+        report = IntrospectionMode._ReportModel(
+            capability_overview="\n\n".join(plan.capability_overview for plan, _ in shard_runs),
+            capability_list=list(capabilities.values()),
+            evaluation_metrics=metrics,
+            evaluation_tasks=tasks,
+            final_metric_scores={name: round(scores[name] / weights[name], 4) if weights[name] else 0.0
+                                 for name in scores},
+        )
+        result = report.model_dump()
+        result["metadata"] = {
+            "phase_timings": phases,
+            "max_workers": self.max_workers,
+            "shards": [{"tools": [tool.name for tool in shard], "tasks": task_ids}
+                       for shard, task_ids in zip(shards, shard_task_ids)],
+        }
+        return result
 
     def run(self, model: OpenAIServerModel, tool_collection: ToolCollection) -> Dict[str, Any]:
-        agent = CodeAgent(
-            tools=[*tool_collection.tools], 
-            model=model, 
-            add_base_tools=False # Introspection agent only uses provided tools
+        tools = [*tool_collection.tools]
+        catalog = ToolCatalog(tools)
+        shards = catalog.shards(self.shard_size)
+        # Section repairs are set against what the whole evaluation cost
+        models, run_started = ModelRoles.of(model).map(TokenCounter), time.perf_counter()
+        if len(shards) > 1:
+            result = self.run_sharded(models, shards)
+            result["metadata"]["validation"] = self.validator.summary(models.distinct(), elapsed_since(run_started))
+            return result
+        phases = {}
+
+        started = time.perf_counter()
+        plan = self.plan(models["planner"], tools)
+        phases["planning"] = elapsed_since(started)
+
+        started = time.perf_counter()
+        tasks = self.execute_tasks(models["candidate"], catalog, plan.evaluation_tasks)
+        phases["execution"] = elapsed_since(started)
+
+        started = time.perf_counter()
+        scores = self.score(models["scorer"], plan.evaluation_metrics, tasks)
+        phases["scoring"] = elapsed_since(started)
+
+        report = IntrospectionMode._ReportModel(
+            capability_overview=plan.capability_overview,
+            capability_list=plan.capability_list,
+            evaluation_metrics=plan.evaluation_metrics,
+            evaluation_tasks=tasks,
+            final_metric_scores=scores,
+        )
+        result = report.model_dump()
+        result["metadata"] = {"phase_timings": phases, "max_workers": self.max_workers,
+                              "validation": self.validator.summary(models.distinct(), elapsed_since(run_started))}
+        return result
+
+    def run_incremental(self, model: OpenAIServerModel, tool_collection: ToolCollection,
+                        previous: Dict[str, Any], changes: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Re-test only added or changed tools, carrying everything else forward from the previous report.
+
+        Previous tasks are carried forward unless they called a changed or removed
+        tool, and previous capabilities unless none of their tools is unchanged.
+        A previous report whose tasks did not record their tool calls is fully
+        re-evaluated once any tool changed or was removed.
+        New tasks are planned for the added and changed tools only, and all tasks
+        are scored against the previous metrics so scores stay comparable.
+        """
+        stale = set(changes["changed"]) | set(changes["removed"])
+        # Tasks of reports from before they recorded their tool calls cannot be told apart from tasks calling no tool
+        if stale and any("tool_calls" not in task for task in previous.get("evaluation_tasks", [])):
+            print("Previous report does not record the tool calls of its tasks; re-evaluating all tools")
+            return self.run(model, tool_collection)
+        tools = [*tool_collection.tools]
+        previous_report = IntrospectionMode._ReportModel.model_validate(previous)
+        models, run_started = ModelRoles.of(model).map(TokenCounter), time.perf_counter()
+        retest = set(changes["added"]) | set(changes["changed"])
+        phases = {}
+
+        carried = [task for task in previous_report.evaluation_tasks
+                   if not stale & {call.tool for call in task.tool_calls}]
+        overview = previous_report.capability_overview
+        # Reports from before capabilities listed their tools can only carry them forward if nothing went stale
+        capabilities = [capability for capability in previous_report.capability_list
+                        if set(capability.tools) & set(changes["unchanged"]) or not (capability.tools or stale)]
+        new_tasks = []
+        if retest:
+            started = time.perf_counter()
+            # Planned against the previous metrics, which all tasks are scored on
+            plan = self.plan(models["planner"], [tool for tool in tools if tool.name in retest],
+                             previous_report.evaluation_metrics)
+            phases["planning"] = elapsed_since(started)
+
+            started = time.perf_counter()
+            # Number the new tasks after the carried ones so ids stay unique
+            first_id = max((task.id for task in carried), default=0) + 1
+            planned = [task.model_copy(update={"id": first_id + i}) for i, task in enumerate(plan.evaluation_tasks)]
+            new_tasks = self.execute_tasks(models["candidate"], ToolCatalog(tools), planned)
+            phases["execution"] = elapsed_since(started)
+
+            # Capabilities re-described for the re-tested tools replace their previous descriptions
+            replanned = {capability.name for capability in plan.capability_list}
+            capabilities = [c for c in capabilities if c.name not in replanned] + plan.capability_list
+            overview = f"{overview}\n\n{plan.capability_overview}"
+
+        tasks = carried + new_tasks
+        if len(carried) == len(previous_report.evaluation_tasks) and not new_tasks:
+            scores = previous_report.final_metric_scores # Nothing was dropped or added, the scores still hold
+        else:
+            started = time.perf_counter()
+            scores = self.score(models["scorer"], previous_report.evaluation_metrics, tasks)
+            phases["scoring"] = elapsed_since(started)
+
+        report = IntrospectionMode._ReportModel(
+            capability_overview=overview,
+            capability_list=capabilities,
+            evaluation_metrics=previous_report.evaluation_metrics,
+            evaluation_tasks=tasks,
+            final_metric_scores=scores,
         )
-        # Use the formatted prompt from __init__
-        result = agent.run(self.INTROSPECT_PROMPT) 
-        return result 
\ No newline at end of file
+        result = report.model_dump()
+        result["incremental_diff"] = incremental_diff(changes, previous_report.final_metric_scores, scores,
+                                                      carried_forward=len(carried), re_evaluated=len(new_tasks))
+        result["metadata"] = {"phase_timings": phases, "max_workers": self.max_workers,
+                              "validation": self.validator.summary(models.distinct(), elapsed_since(run_started))}
+        return result
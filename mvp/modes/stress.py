@@ -0,0 +1,450 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel, Field
+from smolagents import OpenAIServerModel, Tool, ToolCollection
+
+from defaults import DEFAULT_CALLS_PER_LEVEL, DEFAULT_CONCURRENCY, DEFAULT_STRESS_ARGUMENTS
+from fingerprint import incremental_diff, tool_fingerprint
+from mcp_session import tool_call_failed
+from model_roles import ModelRoles
+
+from .base import EvaluationMode, ask_json, describe_tools, elapsed_since, json_schema, map_concurrently
+from .catalog import DEFAULT_SHARD_SIZE
+
+# Latency percentiles reported for every tool and concurrency level
+LATENCY_PERCENTILES = (50, 95, 99)
+# A tool is saturated at the lowest concurrency reaching this share of its peak throughput
+SATURATION_SHARE = 0.9
+# Distinct error messages kept per tool
+MAX_ERROR_SAMPLES = 5
+# Characters of an isError result's text kept as its error message
+MAX_ERROR_LENGTH = 200
+# Skip reason of tools whose derived call the server kept rejecting
+PROBE_FAILED = "Probe call failed"
+# Python types of the JSON schema types found in tool inputs
+JSON_TYPES = {"string": str, "integer": int, "number": (int, float), "boolean": bool, "array": list, "object": dict}
+
+
+# Define nested models outside the main class temporarily for schema generation
+class _StressToolArguments(BaseModel):
+    tool: str = Field(..., description="Tool name")
+    arguments: Dict[str, Any] = Field(default_factory=dict, description="Keyword arguments of one valid call")
+    skip_reason: Optional[str] = Field(
+        None,
+        description="Why the tool must not be called repeatedly (e.g. every call modifies data), otherwise null"
+    )
+
+class _StressArgumentsModel(BaseModel):
+    tool_arguments: List[_StressToolArguments] = Field(..., description="One call per tool")
+
+class _StressLatency(BaseModel):
+    mean: Optional[float] = Field(None, description="Mean latency of the successful calls (seconds)")
+    p50: Optional[float] = Field(None, description="Median latency (seconds)")
+    p95: Optional[float] = Field(None, description="95th percentile latency (seconds)")
+    p99: Optional[float] = Field(None, description="99th percentile latency (seconds)")
+    max: Optional[float] = Field(None, description="Maximum latency (seconds)")
+
+class _StressLevel(BaseModel):
+    concurrency: int = Field(..., description="Number of calls in flight")
+    calls: int = Field(..., description="Calls made")
+    errors: int = Field(..., description="Calls that raised")
+    error_rate: float = Field(..., description="Share of calls that raised (0-1)")
+    duration: float = Field(..., description="Wall time of the level (seconds)")
+    throughput: float = Field(..., description="Successful calls per second")
+    latency: _StressLatency = Field(..., description="Latency of the successful calls")
+    slowdown: Optional[float] = Field(None, description="p95 latency relative to the lowest concurrency level")
+
+class _StressToolResult(BaseModel):
+    tool: str = Field(..., description="Tool name")
+    arguments: Dict[str, Any] = Field(default_factory=dict, description="Arguments of the replayed call")
+    arguments_source: str = Field(..., description="'cache', 'previous_report', 'llm' or 'repaired'")
+    skipped: Optional[str] = Field(None, description="Why the tool was not load-tested")
+    levels: List[_StressLevel] = Field(default_factory=list, description="Results per concurrency level")
+    peak_throughput: Optional[float] = Field(None, description="Highest throughput reached (calls per second)")
+    saturation_concurrency: Optional[int] = Field(
+        None,
+        description="Lowest concurrency reaching 90% of the peak throughput, beyond which calls mostly queue"
+    )
+    error_samples: List[str] = Field(default_factory=list, description="Distinct error messages")
+
+class _StressReportModel(BaseModel):
+    tools: List[_StressToolResult] = Field(..., description="Load test results per tool")
+    summary: List[_StressLevel] = Field(..., description="Results per concurrency level over the calls of all tools")
+
+
+class ArgumentCache:
+    """Derived call arguments on disk, keyed by tool fingerprint so that a changed schema is derived again."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def get(self, tool: Tool) -> Optional[_StressToolArguments]:
+        entry = self.entries.get(tool_fingerprint(tool))
+        return _StressToolArguments.model_validate(entry) if entry else None
+
+    def put(self, tool: Tool, arguments: _StressToolArguments):
+        self.entries[tool_fingerprint(tool)] = arguments.model_dump()
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Written atomically, the file may be shared by concurrent runs
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.path)
+
+
+def check_arguments(tool: Tool, arguments: Dict[str, Any]) -> Optional[str]:
+    """Catch derived arguments the tool's input schema rules out, before calling the server."""
+    unknown = sorted(set(arguments) - set(tool.inputs))
+    if unknown:
+        return f"Unknown arguments {unknown}, the tool takes {sorted(tool.inputs)}"
+    for name, value in arguments.items():
+        expected = JSON_TYPES.get(tool.inputs[name].get("type"))
+        # bool is an int to Python, but not to JSON schema
+        if expected and value is not None and (not isinstance(value, expected)
+                                               or isinstance(value, bool) and expected is not bool):
+            return f"Argument '{name}' should be of type {tool.inputs[name]['type']}, got {value!r}"
+    return None
+
+
+def call_tool(tool: Tool, arguments: Dict[str, Any]) -> Optional[str]:
+    """Call a tool once; returns the error message if it raised or the server returned an isError result."""
+    try:
+        output = tool(**arguments)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    if tool_call_failed():
+        return f"isError result: {str(output)[:MAX_ERROR_LENGTH]}"
+    return None
+
+
+def level_stats(concurrency: int, latencies: np.ndarray, failed: np.ndarray, duration: float) -> _StressLevel:
+    """Summarize the calls of one concurrency level."""
+    succeeded = latencies[~failed]
+    latency = _StressLatency()
+    if succeeded.size:
+        percentiles = np.percentile(succeeded, LATENCY_PERCENTILES)
+        latency = _StressLatency(
+            mean=round(float(succeeded.mean()), 6),
+            max=round(float(succeeded.max()), 6),
+            **{f"p{q}": round(float(value), 6) for q, value in zip(LATENCY_PERCENTILES, percentiles)},
+        )
+    errors = int(failed.sum())
+    return _StressLevel(
+        concurrency=concurrency,
+        calls=int(latencies.size),
+        errors=errors,
+        error_rate=round(errors / latencies.size, 4) if latencies.size else 0.0,
+        duration=round(duration, 3),
+        throughput=round(succeeded.size / duration, 3) if duration > 0 else 0.0,
+        latency=latency,
+    )
+
+
+def add_degradation(levels: List[_StressLevel]):
+    """Fill in each level's slowdown against the lowest concurrency level."""
+    baseline = levels[0].latency.p95 if levels else None
+    for level in levels:
+        if baseline and level.latency.p95 is not None:
+            level.slowdown = round(level.latency.p95 / baseline, 3)
+
+
+# Define the main mode class
+class StressMode(EvaluationMode):
+    """Load-tests the server's tools and reports how their latency degrades under concurrency.
+
+    The LLM is only used once, to derive a valid call for every tool from its
+    input schema. Each derived call is probed against the server, re-derived
+    with the server's error if it fails, and cached by tool fingerprint, so
+    later runs of an unchanged server make no LLM calls. Every tool is then
+    called `calls_per_level` times at each concurrency level, one tool at a
+    time, optionally paced to `rate` calls per second; latencies are measured
+    by the harness. The calls are derived by the planner model.
+    """
+
+    # Define nested models properly within the class scope for usage
+    ToolResult = _StressToolResult
+    Level = _StressLevel
+
+    # Store the report model class for schema generation later
+    _ReportModel = _StressReportModel
+
+    ARGUMENTS_PROMPT_TEMPLATE = """
+    You are preparing a load test of an MCP server. For each tool below, provide the arguments of one call that is valid according to the tool's input schema and that can safely be repeated many times: prefer reads and lookups with realistic values.
+
+    {ToolDescriptions}
+
+    If every call to a tool would create, modify or delete data, or have effects outside the server (sending messages, spending money, ...), give no arguments and set skip_reason instead.
+
+    Output only a JSON object (without the "```json" and "```" tags) following this schema:
+
+    {ArgumentsSchema}
+    """
+
+    REPAIR_PROMPT_TEMPLATE = """
+    You are preparing a load test of an MCP server. The calls below were rejected by the server. Correct their arguments so that they are valid according to the tool's input schema and can safely be repeated many times, or set skip_reason if no such call exists.
+
+    {ToolDescriptions}
+
+    ## Rejected Calls
+    {Failures}
+
+    Output only a JSON object (without the "```json" and "```" tags) following this schema:
+
+    {ArgumentsSchema}
+    """
+
+    # Load-test calls must always reach the server, they are not logged for --resume
+    log_tool_calls = False
+
+    def __init__(self, max_workers: int = 4, shard_size: int = DEFAULT_SHARD_SIZE,
+                 concurrency: Sequence[int] = DEFAULT_CONCURRENCY, calls_per_level: int = DEFAULT_CALLS_PER_LEVEL,
+                 rate: Optional[float] = None, arguments_file: Optional[str] = DEFAULT_STRESS_ARGUMENTS):
+        if not concurrency or min(concurrency) < 1:
+            raise ValueError("Concurrency levels must be positive integers")
+        if calls_per_level < 1:
+            raise ValueError("calls_per_level must be at least 1")
+        self.max_workers = max_workers
+        self.shard_size = shard_size
+        self.concurrency = sorted(set(concurrency))
+        self.calls_per_level = calls_per_level
+        self.rate = rate
+        self.arguments_file = arguments_file
+        # Generate schemas after the classes are defined
+        self.StressReportSchema = json_schema(StressMode._ReportModel)
+        self.ArgumentsSchema = json_schema(_StressArgumentsModel)
+
+    def ask_arguments(self, model: OpenAIServerModel, tools: List[Tool],
+                      failures: Optional[Dict[str, Tuple[Dict[str, Any], str]]] = None
+                      ) -> Dict[str, _StressToolArguments]:
+        """Derive one call per tool, or correct the failed calls when given their errors."""
+        if failures:
+            prompt = self.REPAIR_PROMPT_TEMPLATE.format(
+                ToolDescriptions=describe_tools(tools),
+                Failures="\n".join(f"- {name}({json.dumps(arguments, ensure_ascii=False)}): {error}"
+                                   for name, (arguments, error) in failures.items()),
+                ArgumentsSchema=self.ArgumentsSchema,
+            )
+        else:
+            prompt = self.ARGUMENTS_PROMPT_TEMPLATE.format(ToolDescriptions=describe_tools(tools),
+                                                           ArgumentsSchema=self.ArgumentsSchema)
+        names = {tool.name for tool in tools}
+        derived = _StressArgumentsModel.model_validate(ask_json(model, prompt)).tool_arguments
+        return {entry.tool: entry for entry in derived if entry.tool in names}
+
+    def derive_arguments(self, model: OpenAIServerModel, tools: List[Tool]) -> Dict[str, _StressToolArguments]:
+        """Derive calls for tools without cached arguments, in prompts of at most shard_size tools."""
+        chunks = [tools[i:i + self.shard_size] for i in range(0, len(tools), self.shard_size)]
+        derived = {}
+        for chunk_arguments in map_concurrently(lambda chunk: self.ask_arguments(model, chunk), chunks,
+                                                self.max_workers):
+            derived.update(chunk_arguments)
+        return derived
+
+    def prepare_calls(self, model: OpenAIServerModel, tools: List[Tool],
+                      known: Optional[Dict[str, _StressToolArguments]] = None
+                      ) -> Tuple[Dict[str, _StressToolArguments], Dict[str, str], Dict[str, int]]:
+        """Arguments and their source for every tool: known, cached, or derived, probed and repaired.
+
+        known arguments (e.g. those of a previous report for unchanged tools) are used as they are.
+        """
+        cache = ArgumentCache(self.arguments_file)
+        arguments, sources = {}, {}
+        for tool in tools:
+            if known and tool.name in known:
+                arguments[tool.name], sources[tool.name] = known[tool.name], "previous_report"
+            elif (cached := cache.get(tool)) is not None:
+                arguments[tool.name], sources[tool.name] = cached, "cache"
+
+        missing = [tool for tool in tools if tool.name not in arguments]
+        if missing:
+            for name, entry in self.derive_arguments(model, missing).items():
+                arguments[name], sources[name] = entry, "llm"
+            # Probe each derived call once, and give the failed ones a single chance to be corrected
+            probed = [tool for tool in missing if tool.name in arguments and not arguments[tool.name].skip_reason]
+            errors = map_concurrently(lambda tool: self.probe(tool, arguments[tool.name].arguments), probed,
+                                      self.max_workers)
+            failures = {tool.name: (arguments[tool.name].arguments, error)
+                        for tool, error in zip(probed, errors) if error}
+            if failures:
+                failed_tools = [tool for tool in probed if tool.name in failures]
+                repaired = self.ask_arguments(model, failed_tools, failures)
+                for tool in failed_tools:
+                    entry = repaired.get(tool.name)
+                    error = self.probe(tool, entry.arguments) if entry and not entry.skip_reason else None
+                    if entry is None or error:
+                        entry = _StressToolArguments(
+                            tool=tool.name, arguments=arguments[tool.name].arguments,
+                            skip_reason=f"{PROBE_FAILED}: {error or failures[tool.name][1]}",
+                        )
+                        sources[tool.name] = "llm"
+                    else:
+                        sources[tool.name] = "repaired"
+                    arguments[tool.name] = entry
+            # Calls that failed their probe are not cached, the server may have been down
+            for tool in missing:
+                entry = arguments.get(tool.name)
+                if entry is not None and not (entry.skip_reason or "").startswith(PROBE_FAILED):
+                    cache.put(tool, entry)
+            cache.save()
+
+        counts = {source: list(sources.values()).count(source)
+                  for source in ("previous_report", "cache", "llm", "repaired")}
+        return arguments, sources, counts
+
+    @staticmethod
+    def probe(tool: Tool, arguments: Dict[str, Any]) -> Optional[str]:
+        """Check a derived call against the schema, then make it once."""
+        return check_arguments(tool, arguments) or call_tool(tool, arguments)
+
+    def run_level(self, tool: Tool, arguments: Dict[str, Any], concurrency: int
+                  ) -> Tuple[np.ndarray, np.ndarray, float, List[str]]:
+        """Call a tool calls_per_level times with the given number of calls in flight.
+
+        Returns the latency of every call, which calls failed, the wall time and the error messages.
+        """
+        latencies = np.zeros(self.calls_per_level)
+        failed = np.zeros(self.calls_per_level, dtype=bool)
+        messages: List[str] = []
+        interval = 1 / self.rate if self.rate else 0.0
+        next_call = iter(range(self.calls_per_level))
+        lock = threading.Lock()
+        started = time.perf_counter()
+
+        def worker(_):
+            while True:
+                with lock:
+                    index = next(next_call, None)
+                if index is None:
+                    return
+                scheduled = started + index * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                # Paced calls are timed from their scheduled start, so time spent queued behind a slow
+                # server counts as latency instead of silently lowering the rate
+                call_started = scheduled if interval else time.perf_counter()
+                error = call_tool(tool, arguments)
+                latencies[index] = time.perf_counter() - call_started
+                if error:
+                    failed[index] = True
+                    with lock:
+                        messages.append(error)
+
+        # Tool calls go through the MCP client's own event loop, so workers can share the tool
+        map_concurrently(worker, range(concurrency), concurrency)
+        return latencies, failed, time.perf_counter() - started, messages
+
+    def stress_tool(self, tool: Tool, entry: _StressToolArguments, source: str
+                    ) -> Tuple[_StressToolResult, List[Tuple[np.ndarray, np.ndarray, float]]]:
+        """Run every concurrency level against one tool; also returns the raw calls for the summary."""
+        result = _StressToolResult(tool=tool.name, arguments=entry.arguments, arguments_source=source,
+                                   skipped=entry.skip_reason)
+        if entry.skip_reason:
+            return result, []
+        raw, errors = [], []
+        for concurrency in self.concurrency:
+            latencies, failed, duration, messages = self.run_level(tool, entry.arguments, concurrency)
+            raw.append((latencies, failed, duration))
+            result.levels.append(level_stats(concurrency, latencies, failed, duration))
+            errors.extend(message for message in messages if message not in errors)
+        add_degradation(result.levels)
+        throughputs = np.array([level.throughput for level in result.levels])
+        result.peak_throughput = float(throughputs.max())
+        if result.peak_throughput > 0:
+            result.saturation_concurrency = result.levels[
+                int(np.argmax(throughputs >= SATURATION_SHARE * result.peak_throughput))].concurrency
+        result.error_samples = errors[:MAX_ERROR_SAMPLES]
+        return result, raw
+
+    def summarize(self, raw_runs: List[List[Tuple[np.ndarray, np.ndarray, float]]]) -> List[_StressLevel]:
+        """Per concurrency level, over the calls of all tools (tools run one after another)."""
+        summary = []
+        for index, concurrency in enumerate(self.concurrency):
+            runs = [raw[index] for raw in raw_runs if raw]
+            if not runs:
+                continue
+            summary.append(level_stats(
+                concurrency,
+                np.concatenate([latencies for latencies, _, _ in runs]),
+                np.concatenate([failed for _, failed, _ in runs]),
+                sum(duration for _, _, duration in runs),
+            ))
+        add_degradation(summary)
+        return summary
+
+    def load_test(self, model: OpenAIServerModel, tools: List[Tool],
+                  known: Optional[Dict[str, _StressToolArguments]] = None) -> Dict[str, Any]:
+        phases = {}
+
+        started = time.perf_counter()
+        arguments, sources, counts = self.prepare_calls(model, tools, known)
+        phases["arguments"] = elapsed_since(started)
+
+        started = time.perf_counter()
+        results, raw_runs = [], []
+        for tool in tools:
+            entry = arguments.get(tool.name) or _StressToolArguments(tool=tool.name,
+                                                                      skip_reason="No call was derived for the tool")
+            # Tools are tested one at a time so that their curves do not interfere
+            result, raw = self.stress_tool(tool, entry, sources.get(tool.name, "llm"))
+            results.append(result)
+            raw_runs.append(raw)
+        phases["load"] = elapsed_since(started)
+
+        report = StressMode._ReportModel(tools=results, summary=self.summarize(raw_runs))
+        result = report.model_dump()
+        result["metadata"] = {
+            "phase_timings": phases,
+            "max_workers": self.max_workers,
+            "concurrency": self.concurrency,
+            "calls_per_level": self.calls_per_level,
+            "rate": self.rate,
+            "arguments": {"file": self.arguments_file, **counts},
+        }
+        return result
+
+    def run(self, model: OpenAIServerModel, tool_collection: ToolCollection) -> Dict[str, Any]:
+        return self.load_test(ModelRoles.of(model)["planner"], [*tool_collection.tools])
+
+    def run_incremental(self, model: OpenAIServerModel, tool_collection: ToolCollection,
+                        previous: Dict[str, Any], changes: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Load-test all tools again, reusing the previous report's calls for unchanged tools.
+
+        Latency can regress without any schema change, so nothing is carried
+        forward except the arguments. The diff compares each tool's p95 latency
+        (in milliseconds) at the highest concurrency level both runs tested.
+        """
+        previous_report = StressMode._ReportModel.model_validate(previous)
+        unchanged = set(changes["unchanged"])
+        # Calls the server rejected last time are derived again
+        known = {tool.tool: _StressToolArguments(tool=tool.tool, arguments=tool.arguments, skip_reason=tool.skipped)
+                 for tool in previous_report.tools
+                 if tool.tool in unchanged and not (tool.skipped or "").startswith(PROBE_FAILED)}
+        result = self.load_test(ModelRoles.of(model)["planner"], [*tool_collection.tools], known)
+
+        previous_levels = set(previous.get("metadata", {}).get("concurrency", []))
+        concurrency = max(previous_levels & set(self.concurrency), default=None)
+
+        def p95_ms(tools: List[_StressToolResult]) -> Dict[str, float]:
+            return {tool.tool: round(level.latency.p95 * 1000, 2) for tool in tools for level in tool.levels
+                    if level.concurrency == concurrency and level.latency.p95 is not None}
+
+        current_tools = [_StressToolResult.model_validate(tool) for tool in result["tools"]]
+        result["incremental_diff"] = incremental_diff(changes, p95_ms(previous_report.tools), p95_ms(current_tools),
+                                                      carried_forward=0, re_evaluated=len(current_tools))
+        result["incremental_diff"]["concurrency"] = concurrency
+        return result
@@ -0,0 +1,194 @@
+"""Harness-side validation of the report sections the LLM writes, with targeted repair.
+
+Every section of a report (a plan, the scores, a sub-interview result, ...) is
+parsed and validated against its pydantic model as soon as the LLM hands it
+in. When validation fails, the LLM is shown the validation errors and asked
+again for the failing top-level fields only, for at most `max_repairs` rounds;
+the fields that did validate are kept. Without this, a malformed section was
+only noticed downstream and the whole evaluation was run again.
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+from smolagents import OpenAIServerModel
+from smolagents.models import MessageRole
+
+from defaults import DEFAULT_MAX_REPAIRS
+from wrappers import TokenCounter
+
+from .base import elapsed_since, extract_json, json_schema
+
+
+class SectionValidationError(ValueError):
+    """A report section still failed validation after the repair budget was spent."""
+
+
+def _message(role: str, text: str) -> Dict[str, Any]:
+    return {"role": role, "content": [{"type": "text", "text": text}]}
+
+
+def _cost(input_tokens: int = 0, output_tokens: int = 0, duration: float = 0.0) -> Dict[str, Any]:
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "time": round(duration, 3)}
+
+
+def _add_costs(*costs: Dict[str, Any]) -> Dict[str, Any]:
+    return _cost(sum(c["input_tokens"] for c in costs), sum(c["output_tokens"] for c in costs),
+                 sum(c["time"] for c in costs))
+
+
+def field_schemas(model_class: Type[BaseModel], fields: List[str]) -> Dict[str, Any]:
+    """The part of a model's JSON schema describing the given top-level fields."""
+    schema = json_schema(model_class)
+    subset = {"properties": {name: schema["properties"][name] for name in fields if name in schema["properties"]}}
+    # Keep the definitions the fields refer to, without copying the schema (it is shared)
+    if "$defs" in schema and "$ref" in json.dumps(subset):
+        subset["$defs"] = schema["$defs"]
+    return subset
+
+
+def validation_errors(model_class: Type[BaseModel], data: Any,
+                      context: Optional[Dict[str, Any]] = None) -> tuple[Optional[BaseModel], Dict[str, List[str]]]:
+    """Validate data against a model, returning the instance or the error messages by top-level field.
+
+    Errors that do not belong to a single field (e.g. the data is not an object)
+    are reported against every field.
+    """
+    try:
+        return model_class.model_validate(data, context=context), {}
+    except ValidationError as e:
+        errors: Dict[str, List[str]] = {}
+        for error in e.errors():
+            location = ".".join(map(str, error["loc"]))
+            field = error["loc"][0] if error["loc"] else None
+            for name in ([field] if field in model_class.model_fields else model_class.model_fields):
+                errors.setdefault(name, []).append(f"{location or 'answer'}: {error['msg']}")
+        return None, errors
+
+
+class SectionValidator:
+    """Validates report sections and repairs the failing fields, keeping count of what repairs cost.
+
+    The cost of each repair is set against rerunning the evaluation as a whole,
+    which is what a section failing validation used to require.
+    """
+
+    REPAIR_PROMPT_TEMPLATE = """
+    Your answer does not follow the required schema. Correct only the fields below; the other fields are kept as they are.
+
+    ## Validation Errors
+    {Errors}
+
+    ## Schema of the Fields to Correct
+    {Schemas}
+
+    Output only a JSON object (without the "```json" and "```" tags) with exactly these keys: {Fields}
+    """
+
+    def __init__(self, max_repairs: int = DEFAULT_MAX_REPAIRS):
+        if max_repairs < 0:
+            raise ValueError("max_repairs must not be negative")
+        self.max_repairs = max_repairs
+        self.sections: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def ask(self, model: OpenAIServerModel, prompt: str, model_class: Type[BaseModel], section: str,
+            context: Optional[Dict[str, Any]] = None) -> BaseModel:
+        """Send a single prompt to the model and validate its reply, repairing it if needed."""
+        started = time.perf_counter()
+        message = model([_message(MessageRole.USER, prompt)])
+        rerun = _cost(model.last_input_token_count or 0, model.last_output_token_count or 0, elapsed_since(started))
+        return self.check(model, prompt, message.content or "", model_class, section, rerun, context)
+
+    def check(self, model: OpenAIServerModel, prompt: str, answer: Any, model_class: Type[BaseModel], section: str,
+              rerun: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> BaseModel:
+        """Validate an answer to prompt (e.g. an agent's final answer), repairing the failing fields.
+
+        rerun is the cost of producing the answer again from scratch, reported
+        alongside what the repairs cost.
+        """
+        data = answer
+        # A missing answer (e.g. an agent that stopped without one, or a JSON null) has every field repaired
+        errors = {name: ["answer: missing"] for name in model_class.model_fields}
+        if isinstance(answer, str):
+            try:
+                data = extract_json(answer)
+            except ValueError as e: # json.JSONDecodeError is a ValueError
+                data = None
+                errors = {name: [f"answer: not valid JSON ({e})"] for name in model_class.model_fields}
+        if data is not None:
+            instance, errors = validation_errors(model_class, data, context)
+        if not isinstance(data, dict):
+            data = {}
+
+        repairs, repaired_fields, spent = 0, set(), []
+        while errors and repairs < self.max_repairs:
+            repairs += 1
+            fields = sorted(errors)
+            repaired_fields.update(fields)
+            repair_prompt = self.REPAIR_PROMPT_TEMPLATE.format(
+                Errors="\n".join(f"- {message}" for name in fields for message in errors[name]),
+                Schemas=json.dumps(field_schemas(model_class, fields), ensure_ascii=False),
+                Fields=", ".join(fields),
+            )
+            # The model sees its answer as it currently stands, not every earlier attempt
+            previous = json.dumps(data, ensure_ascii=False) if data else str(answer)
+            started = time.perf_counter()
+            message = model([_message(MessageRole.USER, prompt), _message(MessageRole.ASSISTANT, previous),
+                             _message(MessageRole.USER, repair_prompt)])
+            spent.append(_cost(model.last_input_token_count or 0, model.last_output_token_count or 0,
+                               elapsed_since(started)))
+            try:
+                patch = extract_json(message.content or "")
+            except ValueError as e:
+                errors = {name: [f"answer: not valid JSON ({e})"] for name in fields}
+                continue
+            if isinstance(patch, dict):
+                data.update({name: value for name, value in patch.items() if name in errors})
+            instance, errors = validation_errors(model_class, data, context)
+
+        status = "failed" if errors else "repaired" if repairs else "valid"
+        self.record({"section": section, "status": status, "repairs": repairs, "fields": sorted(repaired_fields),
+                     "repair": _add_costs(*spent), "rerun": rerun})
+        if errors:
+            raise SectionValidationError(
+                f"{section} failed validation after {repairs} repair(s): "
+                + "; ".join(message for messages in errors.values() for message in messages)
+            )
+        return instance
+
+    def record(self, entry: Dict[str, Any]):
+        with self._lock:
+            self.sections.append(entry)
+
+    def summary(self, run: List[TokenCounter], duration: float) -> Dict[str, Any]:
+        """Validation outcomes, and what the repairs cost against a section or full rerun.
+
+        run counted the tokens of the whole evaluation (one counter per model), which lasted duration seconds.
+        """
+        repaired = [entry for entry in self.sections if entry["status"] != "valid"]
+        repair = _add_costs(*(entry["repair"] for entry in self.sections))
+        full_rerun = saved = _cost()
+        if any(entry["status"] == "repaired" for entry in repaired):
+            # The evaluation as it would have run without the repairs
+            full_rerun = _cost(sum(counter.input_tokens for counter in run) - repair["input_tokens"],
+                               sum(counter.output_tokens for counter in run) - repair["output_tokens"],
+                               duration - repair["time"])
+            saved = _cost(full_rerun["input_tokens"] - repair["input_tokens"],
+                          full_rerun["output_tokens"] - repair["output_tokens"], full_rerun["time"] - repair["time"])
+        return {
+            "max_repairs": self.max_repairs,
+            "sections": len(self.sections),
+            "valid": len(self.sections) - len(repaired),
+            "repaired": sum(entry["status"] == "repaired" for entry in repaired),
+            "failed": sum(entry["status"] == "failed" for entry in repaired),
+            "repair_calls": sum(entry["repairs"] for entry in self.sections),
+            "repair_cost": repair,
+            "section_rerun_cost": _add_costs(*(entry["rerun"] for entry in repaired)),
+            "full_rerun_cost": full_rerun,
+            "saved": saved,
+            "repairs": repaired,
+        }
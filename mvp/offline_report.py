@@ -0,0 +1,73 @@
+"""Self-contained HTML reports that open offline and stay fast for large evaluations.
+
+The template (modes/templates/template_offline.html) inlines all of its CSS
+and JavaScript and draws charts as SVG, so the page loads nothing from the
+network. The report is embedded once as compact JSON, gzip-compressed and
+base64-encoded when it is large (the browser inflates it with
+DecompressionStream). Long lists are paginated and their details only built
+when opened, and sections below the fold render as they scroll into view.
+"""
+
+import base64
+import gzip
+import json
+from typing import Any, Dict, Optional, Tuple
+
+TEMPLATE_FILE = "template_offline.html"
+DATA_PLACEHOLDER = "<!-- REPORT_DATA -->"
+TITLE_PLACEHOLDER = "REPORT_TITLE"
+# Payloads above this size (bytes of compact JSON) are compressed
+COMPRESS_THRESHOLD = 256 * 1024
+
+TITLES = {
+    "introspect": "MCP Service Evaluation Report",
+    "interview": "MCP Agent Interview Evaluation Report",
+    "stress": "MCP Server Load Test Report",
+}
+
+
+def encode_payload(result: Dict[str, Any], compress: Optional[bool] = None) -> Tuple[str, str, int]:
+    """Serialize the result for embedding: (encoding, payload, size of the compact JSON in bytes).
+
+    compress=None compresses only payloads above COMPRESS_THRESHOLD.
+    """
+    data = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if compress is None:
+        compress = len(data) > COMPRESS_THRESHOLD
+    if compress:
+        payload = base64.b64encode(gzip.compress(data, compresslevel=6)).decode("ascii")
+        return "gzip+base64", payload, len(data)
+    # "</script" would end the script element early and "<!--" changes how the rest is parsed; outside
+    # strings JSON has no "<", ">" or "&", inside them the escapes are the same characters
+    text = data.decode("utf-8").replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+    return "json", text, len(data)
+
+
+def build_offline_html(template: str, result: Dict[str, Any], mode: str,
+                       compress: Optional[bool] = None) -> Tuple[str, Dict[str, Any]]:
+    """Fill the offline template with the report; returns the HTML and statistics about the payload."""
+    encoding, payload, json_bytes = encode_payload(result, compress)
+    data_tag = (f'<script type="application/json" id="report-data" data-mode="{mode}" data-encoding="{encoding}">'
+                f'{payload}</script>')
+    html = template.replace(TITLE_PLACEHOLDER, TITLES.get(mode, "MCP Evaluation Report")).replace(DATA_PLACEHOLDER, data_tag)
+    return html, {
+        "encoding": encoding,
+        "json_bytes": json_bytes,
+        "payload_bytes": len(payload.encode("utf-8")),
+        "html_bytes": len(html.encode("utf-8")),
+    }
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024 or unit == "MB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def describe_build(stats: Dict[str, Any], seconds: float) -> str:
+    """One-line size/timing summary printed when the report is saved."""
+    payload = format_size(stats["json_bytes"])
+    if stats["encoding"] != "json":
+        payload += f" JSON -> {format_size(stats['payload_bytes'])} {stats['encoding']}"
+    return f"{format_size(stats['html_bytes'])}, payload {payload}, saved in {seconds * 1000:.0f} ms"
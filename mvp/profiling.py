@@ -0,0 +1,217 @@
+"""OpenTelemetry profiling of evaluation runs.
+
+Tracing is set up once per process: smolagents is instrumented with
+openinference, which opens spans for every agent run, agent step, model call
+and tool call. Each profiled run gets its own root span; the spans of its trace
+are collected in memory, exported when the run ends (appended as JSON lines to
+a trace file, or sent to an OTLP/HTTP endpoint) and summarized into the
+report's `performance` block.
+"""
+
+import json
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from openinference.instrumentation.smolagents import SmolagentsInstrumentor
+from openinference.semconv.trace import OpenInferenceSpanKindValues, SpanAttributes
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+
+from defaults import DEFAULT_TRACE_FILE
+
+PERCENTILES = (50, 90, 95, 99)
+
+LLM = OpenInferenceSpanKindValues.LLM.value
+TOOL = OpenInferenceSpanKindValues.TOOL.value
+CHAIN = OpenInferenceSpanKindValues.CHAIN.value
+AGENT = OpenInferenceSpanKindValues.AGENT.value
+# Built into every agent, not a call to the evaluated server
+HARNESS_TOOLS = {"final_answer"}
+
+
+class _SpanCollector(SpanProcessor):
+    """Keeps finished spans in memory, grouped by trace, until their run collects them.
+
+    The instrumentation stays on once installed, so runs that are not profiled
+    (e.g. later daemon jobs) produce spans too; only those of traces registered
+    by a profiled run are kept.
+    """
+
+    def __init__(self):
+        self._spans: Dict[int, List[ReadableSpan]] = {}
+        self._lock = threading.Lock()
+
+    def start(self, trace_id: int):
+        with self._lock:
+            self._spans[trace_id] = []
+
+    def on_end(self, span: ReadableSpan):
+        with self._lock:
+            spans = self._spans.get(span.context.trace_id)
+            if spans is not None:
+                spans.append(span)
+
+    def pop(self, trace_id: int) -> List[ReadableSpan]:
+        with self._lock:
+            return self._spans.pop(trace_id, [])
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """q-th percentile with linear interpolation between closest ranks."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(durations: List[float]) -> Dict[str, Any]:
+    summary = {"calls": len(durations), "total_seconds": round(sum(durations), 3)}
+    for q in PERCENTILES:
+        value = percentile(durations, q)
+        summary[f"p{q}"] = round(value, 4) if value is not None else None
+    summary["max"] = round(max(durations), 4) if durations else None
+    return summary
+
+
+def _duration(span: ReadableSpan) -> float:
+    return (span.end_time - span.start_time) / 1e9
+
+
+def _kind(span: ReadableSpan) -> Optional[str]:
+    return span.attributes.get(SpanAttributes.OPENINFERENCE_SPAN_KIND)
+
+
+def summarize_spans(spans: List[ReadableSpan], phase_timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """Build the report's performance block from the spans of one run."""
+    by_id = {span.context.span_id: span for span in spans}
+    root = next((span for span in spans if span.parent is None), None)
+    llm_spans = [span for span in spans if _kind(span) == LLM]
+    tool_spans = [span for span in spans
+                  if _kind(span) == TOOL and span.attributes.get(SpanAttributes.TOOL_NAME) not in HARNESS_TOOLS]
+
+    tokens_by_step = defaultdict(lambda: [0, 0])
+    for span in llm_spans:
+        if span.parent is not None:
+            tokens = tokens_by_step[span.parent.span_id]
+            tokens[0] += span.attributes.get(SpanAttributes.LLM_TOKEN_COUNT_PROMPT) or 0
+            tokens[1] += span.attributes.get(SpanAttributes.LLM_TOKEN_COUNT_COMPLETION) or 0
+    steps = []
+    for span in sorted(spans, key=lambda s: s.start_time):
+        if _kind(span) != CHAIN or not span.name.startswith("Step "):
+            continue
+        agent = by_id.get(span.parent.span_id) if span.parent is not None else None
+        input_tokens, output_tokens = tokens_by_step[span.context.span_id]
+        steps.append({
+            "agent": agent.name if agent is not None and _kind(agent) == AGENT else None,
+            "step": span.name,
+            "duration": round(_duration(span), 3),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+        })
+
+    tool_durations = defaultdict(list)
+    for span in tool_spans:
+        tool_durations[span.attributes.get(SpanAttributes.TOOL_NAME, span.name)].append(_duration(span))
+    llm_seconds = sum(_duration(span) for span in llm_spans)
+    tool_seconds = sum(_duration(span) for span in tool_spans)
+
+    return {
+        "wall_seconds": round(_duration(root), 3) if root is not None else None,
+        "phases": phase_timings or {},
+        "llm": {
+            **latency_summary([_duration(span) for span in llm_spans]),
+            "input_tokens": sum(span.attributes.get(SpanAttributes.LLM_TOKEN_COUNT_PROMPT) or 0 for span in llm_spans),
+            "output_tokens": sum(span.attributes.get(SpanAttributes.LLM_TOKEN_COUNT_COMPLETION) or 0 for span in llm_spans),
+        },
+        "tools": {
+            **latency_summary([d for durations in tool_durations.values() for d in durations]),
+            "per_tool": {name: latency_summary(durations) for name, durations in sorted(tool_durations.items())},
+        },
+        # Summed over concurrent agents, so both can exceed the wall time
+        "time_split": {
+            "llm_seconds": round(llm_seconds, 3),
+            "tool_seconds": round(tool_seconds, 3),
+            "llm_share": round(llm_seconds / (llm_seconds + tool_seconds), 3) if llm_seconds + tool_seconds else None,
+        },
+        "steps": steps,
+    }
+
+
+def export_spans(spans: List[ReadableSpan], trace_file: Optional[str] = None,
+                 otlp_endpoint: Optional[str] = None) -> str:
+    """Send the spans to an OTLP/HTTP endpoint if given, else append them to a JSONL trace file."""
+    if otlp_endpoint:
+        exporter = OTLPSpanExporter(endpoint=otlp_endpoint)
+        try:
+            exporter.export(spans)
+        finally:
+            exporter.shutdown()
+        return otlp_endpoint
+    trace_file = trace_file or DEFAULT_TRACE_FILE
+    os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+    with open(trace_file, "a", encoding="utf-8") as f:
+        for span in spans:
+            f.write(json.dumps(json.loads(span.to_json()), ensure_ascii=False) + "\n")
+    return trace_file
+
+
+class RunProfile:
+    """Spans of one profiled run, available once the run has ended."""
+
+    def __init__(self):
+        self.spans: List[ReadableSpan] = []
+        self.trace_id: Optional[str] = None
+        self.exported_to: Optional[str] = None
+
+    def summary(self, phase_timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        return {
+            **summarize_spans(self.spans, phase_timings),
+            "trace_id": self.trace_id,
+            "exported_to": self.exported_to,
+        }
+
+
+class Profiler:
+    """Process-wide tracer provider with the smolagents instrumentation turned on."""
+
+    _instance: Optional["Profiler"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.collector = _SpanCollector()
+        self.provider = TracerProvider(resource=Resource.create({"service.name": "vibe-evaluator"}))
+        self.provider.add_span_processor(self.collector)
+        SmolagentsInstrumentor().instrument(tracer_provider=self.provider)
+        self.tracer = self.provider.get_tracer(__name__)
+
+    @classmethod
+    def get(cls) -> "Profiler":
+        # Instrumenting patches smolagents classes, which must only happen once
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = Profiler()
+            return cls._instance
+
+    @contextmanager
+    def profile_run(self, name: str, trace_file: Optional[str] = None, otlp_endpoint: Optional[str] = None,
+                    attributes: Optional[Dict[str, Any]] = None) -> Iterator[RunProfile]:
+        """Trace everything inside the block under one root span, then export and collect its spans."""
+        run_profile = RunProfile()
+        trace_id = None
+        try:
+            with self.tracer.start_as_current_span(name, attributes=attributes or {}) as span:
+                trace_id = span.get_span_context().trace_id
+                self.collector.start(trace_id)
+                run_profile.trace_id = f"{trace_id:032x}"
+                yield run_profile
+        finally:
+            # Export what was traced even when the run failed half-way
+            run_profile.spans = self.collector.pop(trace_id)
+            run_profile.exported_to = export_spans(run_profile.spans, trace_file, otlp_endpoint)
@@ -0,0 +1,91 @@
+"""Re-render saved JSON reports as HTML or YAML, without touching the LLM or MCP stack.
+
+    python agent_evaluator.py render introspect_report_20250101_120000.json --output html
+    python agent_evaluator.py render batch_reports/ --output html-offline --output-dir rendered/
+
+Directories are searched recursively for `<mode>_report_<timestamp>.json`
+files. Each report is written next to its JSON file (or into --output-dir)
+under the same mode and timestamp, so a re-rendered report replaces the
+previous rendering of the same run.
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+from typing import List, Optional, Tuple
+
+REPORT_NAME = re.compile(r"^(?P<mode>[a-z]+)_report_(?P<timestamp>.+)\.json$")
+
+
+def find_reports(paths: List[str]) -> List[str]:
+    """Expand directories into the JSON reports they contain, keeping files as given."""
+    reports = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(path, "**", "*_report_*.json"), recursive=True)
+            reports.extend(sorted(report for report in found if REPORT_NAME.match(os.path.basename(report))))
+        else:
+            reports.append(path)
+    return reports
+
+
+def report_identity(path: str, mode: Optional[str] = None) -> Tuple[str, str]:
+    """Mode and timestamp of a report, from its file name (the mode can be forced)."""
+    match = REPORT_NAME.match(os.path.basename(path))
+    timestamp = match.group("timestamp") if match else os.path.splitext(os.path.basename(path))[0]
+    mode = mode or (match.group("mode") if match else None)
+    if not mode:
+        raise ValueError(f"Cannot tell the mode of {path} from its name, pass --mode")
+    return mode, timestamp
+
+
+def render_report(path: str, output_format: str, output_dir: Optional[str] = None, mode: Optional[str] = None):
+    from agent_evaluator import MODES, save_report
+
+    mode, timestamp = report_identity(path, mode)
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}' for {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        result = json.load(f)
+    # The JSON report is the source, do not write it again
+    save_report(result, output_format, mode, timestamp, output_dir=output_dir or os.path.dirname(path) or ".",
+                save_json=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="agent_evaluator.py render",
+        description="Render saved JSON reports as HTML or YAML, without calling any LLM or MCP server",
+    )
+    parser.add_argument("reports", nargs="+", help="JSON report files, or directories to search for them")
+    parser.add_argument("--output", type=str, choices=["html", "html-offline", "yaml"], default="html",
+                        help="Report format (default: html)")
+    parser.add_argument("--output-dir", type=str, help="Directory for the rendered reports (default: next to each report)")
+    parser.add_argument("--mode", type=str, help="Mode of reports not named <mode>_report_<timestamp>.json")
+    args = parser.parse_args(argv)
+
+    reports = find_reports(args.reports)
+    if not reports:
+        print("Error: No reports found", file=sys.stderr)
+        sys.exit(1)
+
+    started = time.perf_counter()
+    failed = 0
+    for path in reports:
+        try:
+            render_report(path, args.output, args.output_dir, args.mode)
+        except (OSError, ValueError) as e:  # json.JSONDecodeError is a ValueError
+            failed += 1
+            print(f"Error rendering {path}: {str(e)}", file=sys.stderr)
+
+    print(f"Rendered {len(reports) - failed}/{len(reports)} reports in {time.perf_counter() - started:.2f}s")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
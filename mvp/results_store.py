@@ -0,0 +1,359 @@
+"""Local SQLite store of evaluation scores, for questions spanning many runs.
+
+save_report indexes every report it saves: one row per run (server, mode,
+model, timestamp, path of the JSON report) and one row per metric or
+capability score. Stress runs are indexed by the success rate, p50/p95
+latency at the highest concurrency and peak throughput of their summary. The query subcommand aggregates the scores with NumPy over
+a runs x metrics matrix:
+
+    python agent_evaluator.py query stats --server "uvx mcp-server-time" --mode introspect
+    python agent_evaluator.py query trend --mode interview --last 90
+    python agent_evaluator.py query leaderboard --mode introspect
+    python agent_evaluator.py query leaderboard --mode stress --metric p95_latency
+
+Servers are identified by the --server-params of the run (the server name in
+batch runs); --server matches any part of it.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import warnings
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from defaults import DEFAULT_RESULTS_DB
+
+QUANTILES = (5, 25, 50, 75, 95)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    server TEXT,
+    mode TEXT NOT NULL,
+    model TEXT,
+    timestamp TEXT NOT NULL,
+    report TEXT
+);
+CREATE TABLE IF NOT EXISTS scores (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    score REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_server_mode_timestamp ON runs(server, mode, timestamp);
+CREATE INDEX IF NOT EXISTS runs_mode_timestamp ON runs(mode, timestamp);
+CREATE INDEX IF NOT EXISTS runs_model ON runs(model);
+CREATE INDEX IF NOT EXISTS scores_run ON scores(run_id);
+CREATE INDEX IF NOT EXISTS scores_metric ON scores(metric, run_id);
+"""
+
+# Where each mode keeps its scores in the report
+SCORE_KEYS = {
+    "introspect": "final_metric_scores",
+    "interview": "capability_scores",
+}
+
+# Summary metrics stress runs are indexed by, in different units (latencies in seconds)
+STRESS_METRICS = ("success_rate", "p50_latency", "p95_latency", "peak_throughput")
+LOWER_IS_BETTER = {"p50_latency", "p95_latency"}
+
+
+def stress_scores(result: Dict[str, Any]) -> Dict[str, float]:
+    """Success rate and peak throughput over all levels of a stress summary, latencies at its highest concurrency."""
+    levels = [level for level in result.get("summary") or [] if level.get("calls")]
+    if not levels:
+        return {}
+    top = max(levels, key=lambda level: level["concurrency"])["latency"]
+    scores = {
+        "success_rate": 1 - sum(level["errors"] for level in levels) / sum(level["calls"] for level in levels),
+        "p50_latency": top.get("p50"),
+        "p95_latency": top.get("p95"),
+        "peak_throughput": max(level["throughput"] for level in levels),
+    }
+    return {metric: score for metric, score in scores.items() if score is not None}
+
+
+def report_scores(result: Dict[str, Any], mode: str) -> Dict[str, Any]:
+    """Scores of a report by metric (or capability) name."""
+    if mode == "stress":
+        return stress_scores(result)
+    return result.get(SCORE_KEYS.get(mode, ""), {}) or {}
+
+
+class ResultsStore:
+    """SQLite results database; safe to write from concurrent batch processes."""
+
+    def __init__(self, path: str = DEFAULT_RESULTS_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Batch workers write concurrently; wait for the lock rather than failing
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> "ResultsStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add_run(self, result: Dict[str, Any], mode: str, timestamp: str, server: Optional[str] = None,
+                report: Optional[str] = None) -> int:
+        """Index a report and its scores; returns the run id."""
+        scores = report_scores(result, mode)
+        model = (result.get("metadata") or {}).get("model")
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (server, mode, model, timestamp, report) VALUES (?, ?, ?, ?, ?)",
+                (server, mode, model, timestamp, report),
+            )
+            self.connection.executemany(
+                "INSERT INTO scores (run_id, metric, score) VALUES (?, ?, ?)",
+                [(cursor.lastrowid, metric, float(score)) for metric, score in scores.items()
+                 if isinstance(score, (int, float))],
+            )
+        return cursor.lastrowid
+
+    def fetch(self, server: Optional[str] = None, mode: Optional[str] = None, model: Optional[str] = None,
+              metrics: Optional[List[str]] = None, since: Optional[str] = None) -> "ScoreMatrix":
+        """Scores of the matching runs, oldest run first."""
+        clauses, parameters = [], []
+        if server:
+            clauses.append("runs.server LIKE ?")
+            parameters.append(f"%{server}%")
+        for column, value in (("runs.mode", mode), ("runs.model", model)):
+            if value:
+                clauses.append(f"{column} = ?")
+                parameters.append(value)
+        if since:
+            clauses.append("runs.timestamp >= ?")
+            parameters.append(since)
+        if metrics:
+            clauses.append(f"scores.metric IN ({', '.join('?' * len(metrics))})")
+            parameters.extend(metrics)
+        rows = self.connection.execute(
+            "SELECT runs.id, runs.server, runs.mode, runs.model, runs.timestamp, scores.metric, scores.score "
+            "FROM runs JOIN scores ON scores.run_id = runs.id "
+            f"{'WHERE ' + ' AND '.join(clauses) if clauses else ''} "
+            "ORDER BY runs.timestamp, runs.id",
+            parameters,
+        ).fetchall()
+        return ScoreMatrix(rows)
+
+
+class ScoreMatrix:
+    """Scores as a runs x metrics matrix (NaN where a run has no score for a metric), runs oldest first."""
+
+    def __init__(self, rows: List[tuple]):
+        columns = list(zip(*rows)) or [()] * 7
+        run_ids = np.array(columns[0], dtype=np.int64)
+        metric_names = np.array(columns[5], dtype=object)
+        # Rows come ordered by time; number the runs in order of first appearance
+        unique_ids, first_row, run_index = np.unique(run_ids, return_index=True, return_inverse=True)
+        order = np.argsort(first_row)
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        run_index = rank[run_index]
+        first_row = first_row[order]
+
+        self.metrics, metric_index = np.unique(metric_names.astype(str), return_inverse=True)
+        self.run_ids = unique_ids[order]
+        self.servers = np.array(columns[1], dtype=object)[first_row]
+        self.modes = np.array(columns[2], dtype=object)[first_row]
+        self.models = np.array(columns[3], dtype=object)[first_row]
+        self.timestamps = np.array(columns[4], dtype=object)[first_row]
+        self.values = np.full((len(self.run_ids), len(self.metrics)), np.nan)
+        self.values[run_index, metric_index] = np.array(columns[6], dtype=float)
+
+    def __len__(self) -> int:
+        return len(self.run_ids)
+
+    def select(self, runs: np.ndarray) -> "ScoreMatrix":
+        """The matrix restricted to some runs (a boolean mask or indices)."""
+        selected = object.__new__(ScoreMatrix)
+        selected.metrics = self.metrics
+        for name in ("run_ids", "servers", "modes", "models", "timestamps", "values"):
+            setattr(selected, name, getattr(self, name)[runs])
+        return selected
+
+    def series(self) -> np.ndarray:
+        """Key of the series (server and mode) every run belongs to."""
+        return np.char.add(np.char.add(self.servers.astype(str), "\t"), self.modes.astype(str))
+
+    def last(self, count: int) -> "ScoreMatrix":
+        """Only the latest `count` runs of every server and mode."""
+        _, series_index, sizes = np.unique(self.series(), return_inverse=True, return_counts=True)
+        # Position of every run within its series: stable-sort by series, then subtract where each series starts
+        position = np.empty(len(self), dtype=np.int64)
+        position[np.argsort(series_index, kind="stable")] = np.arange(len(self)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        return self.select(sizes[series_index] - position <= count)
+
+
+def _quiet(func, *args, **kwargs):
+    # All-NaN columns legitimately aggregate to NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return func(*args, **kwargs)
+
+
+def _number(value) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), 4)
+
+
+def metric_stats(matrix: ScoreMatrix) -> List[Dict[str, Any]]:
+    """Count, mean, variance, extremes and quantiles of every metric, per server and mode."""
+    stats = []
+    series = matrix.series()
+    for key in np.unique(series):
+        runs = np.flatnonzero(series == key)
+        values = matrix.values[runs]
+        counts = np.sum(~np.isnan(values), axis=0)
+        means = _quiet(np.nanmean, values, axis=0)
+        variances = _quiet(np.nanvar, values, axis=0, ddof=1)
+        minimums = _quiet(np.nanmin, values, axis=0)
+        maximums = _quiet(np.nanmax, values, axis=0)
+        quantiles = _quiet(np.nanpercentile, values, QUANTILES, axis=0)
+        for column, metric in enumerate(matrix.metrics):
+            if not counts[column]:
+                continue
+            stats.append({
+                "server": matrix.servers[runs[0]],
+                "mode": matrix.modes[runs[0]],
+                "metric": str(metric),
+                "runs": int(counts[column]),
+                "mean": _number(means[column]),
+                "variance": _number(variances[column]) if counts[column] > 1 else None,
+                "min": _number(minimums[column]),
+                "max": _number(maximums[column]),
+                **{f"p{q}": _number(quantiles[i, column]) for i, q in enumerate(QUANTILES)},
+            })
+    return stats
+
+
+def run_trend(matrix: ScoreMatrix) -> List[Dict[str, Any]]:
+    """Mean score of every run and its change against the previous run of the same server and mode."""
+    run_means = _quiet(np.nanmean, matrix.values, axis=1)
+    trend = []
+    series = matrix.series()
+    for key in np.unique(series):
+        runs = np.flatnonzero(series == key)
+        # Deltas between consecutive runs, per metric and for the run mean
+        metric_deltas = np.diff(matrix.values[runs], axis=0, prepend=np.nan)
+        mean_deltas = np.diff(run_means[runs], prepend=np.nan)
+        for row, run in enumerate(runs):
+            trend.append({
+                "server": matrix.servers[run],
+                "mode": matrix.modes[run],
+                "model": matrix.models[run],
+                "timestamp": matrix.timestamps[run],
+                "mean": _number(run_means[run]),
+                "delta": _number(mean_deltas[row]),
+                "metric_deltas": {str(metric): _number(metric_deltas[row, column])
+                                  for column, metric in enumerate(matrix.metrics)
+                                  if not np.isnan(metric_deltas[row, column])},
+            })
+    return trend
+
+
+def leaderboard(matrix: ScoreMatrix, lower_is_better: bool = False) -> List[Dict[str, Any]]:
+    """Servers ranked by the mean score of their latest run, with their mean over all runs.
+
+    With lower_is_better (latencies) the lowest score ranks first and is the best.
+    """
+    if not len(matrix):
+        return []
+    # Negated scores rank the same way as higher-is-better ones, and are negated back for the output
+    sign = -1.0 if lower_is_better else 1.0
+    run_means = sign * _quiet(np.nanmean, matrix.values, axis=1)
+    scored = ~np.isnan(run_means)
+    servers, server_index = np.unique(matrix.servers.astype(str), return_inverse=True)
+    runs = np.bincount(server_index, weights=scored, minlength=len(servers))
+    totals = np.bincount(server_index, weights=np.where(scored, run_means, 0.0), minlength=len(servers))
+    best = np.full(len(servers), -np.inf)
+    np.maximum.at(best, server_index[scored], run_means[scored])
+    # Runs are ordered by time, so the latest run of a server is its highest index
+    latest = np.full(len(servers), -1)
+    np.maximum.at(latest, server_index[scored], np.flatnonzero(scored))
+    ranked = [index for index in np.argsort(-np.where(latest >= 0, run_means[latest], -np.inf), kind="stable")
+              if latest[index] >= 0]
+    return [{
+        "rank": rank,
+        "server": servers[index],
+        "latest": _number(sign * run_means[latest[index]]),
+        "latest_timestamp": matrix.timestamps[latest[index]],
+        "mean": _number(sign * totals[index] / runs[index]),
+        "best": _number(sign * best[index]),
+        "runs": int(runs[index]),
+    } for rank, index in enumerate(ranked, start=1)]
+
+
+def print_table(rows: List[Dict[str, Any]], columns: List[str]):
+    cells = [[("n/a" if row.get(column) is None else str(row.get(column))) for column in columns] for row in rows]
+    widths = [max([len(column)] + [len(line[i]) for line in cells]) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for line in cells:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="agent_evaluator.py query",
+        description="Aggregate scores across the runs indexed in the results database",
+    )
+    parser.add_argument("report", choices=["stats", "trend", "leaderboard"],
+                        help="stats: per-metric mean/variance/quantiles; trend: run-over-run deltas; "
+                             "leaderboard: servers ranked by their latest run")
+    parser.add_argument("--db", type=str, default=DEFAULT_RESULTS_DB,
+                        help=f"Results database (default: {DEFAULT_RESULTS_DB})")
+    parser.add_argument("--server", type=str, help="Only servers whose parameters (or batch name) contain this text")
+    parser.add_argument("--mode", type=str, choices=[*SCORE_KEYS, "stress"],
+                        help="Only runs of this mode (stress runs have the metrics " + ", ".join(STRESS_METRICS) + ")")
+    parser.add_argument("--model", type=str, help="Only runs with this model")
+    parser.add_argument("--metric", type=str, action="append", help="Only this metric or capability (repeatable)")
+    parser.add_argument("--since", type=str, help="Only runs from this timestamp on (e.g. 20250101 or 20250101_120000)")
+    parser.add_argument("--last", type=int, help="Only the latest N runs of every server")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Error: Results database {args.db} does not exist", file=sys.stderr)
+        sys.exit(1)
+    if args.report == "leaderboard" and not args.mode:
+        # Metrics differ between modes, so their scores are not comparable
+        parser.error("leaderboard requires --mode")
+    if args.report in ("trend", "leaderboard") and args.mode == "stress" and len(args.metric or []) != 1:
+        # Stress metrics are in different units, so their mean is meaningless, and lower latencies are better
+        parser.error(f"{args.report} of stress runs requires one --metric ({', '.join(STRESS_METRICS)})")
+
+    with ResultsStore(args.db) as store:
+        matrix = store.fetch(server=args.server, mode=args.mode, model=args.model, metrics=args.metric,
+                             since=args.since)
+    if args.last:
+        matrix = matrix.last(args.last)
+
+    if args.report == "stats":
+        rows = metric_stats(matrix)
+        columns = ["server", "mode", "metric", "runs", "mean", "variance", "min", *[f"p{q}" for q in QUANTILES], "max"]
+    elif args.report == "trend":
+        rows = run_trend(matrix)
+        columns = ["server", "mode", "timestamp", "model", "mean", "delta"]
+    else:
+        rows = leaderboard(matrix, lower_is_better=args.mode == "stress" and args.metric[0] in LOWER_IS_BETTER)
+        columns = ["rank", "server", "latest", "latest_timestamp", "mean", "best", "runs"]
+
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+    elif rows:
+        print_table(rows, columns)
+    else:
+        print("No matching runs")
+
+
+if __name__ == "__main__":
+    main()
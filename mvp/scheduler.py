@@ -0,0 +1,301 @@
+"""Shared scheduler in front of the LLM endpoints: rate limits, priorities, retries.
+
+Every model call of every run in the process goes through one RequestScheduler
+(RequestScheduler.get()), so concurrent tasks, sub-interviews and daemon jobs
+share the limits of an endpoint instead of each running into them:
+
+- token buckets cap the requests and the tokens per minute sent to an endpoint;
+- waiting calls are served by the priority of their role (see ROLE_PRIORITIES),
+  first come first served within a priority;
+- calls rejected with 429, or a transient server error, are retried after an
+  exponential backoff with full jitter (at least the server's Retry-After), and
+  hold back every call to that endpoint meanwhile;
+- identical calls in flight at the same time are sent once and share the response.
+
+Chat completion endpoints take one conversation per request, so calls are not
+batched into one request: coalescing identical calls is what batching there is.
+Time spent waiting for a turn is reported per role as queueing delay.
+"""
+
+import heapq
+import itertools
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from smolagents import Model, Tool
+from smolagents.models import ChatMessage
+
+from defaults import BACKOFF_BASE_SECONDS, BACKOFF_CAP_SECONDS, DEFAULT_MAX_RETRIES, ROLE_PRIORITIES
+from llm_cache import cache_key
+from wrappers import ModelWrapper, call_usage
+
+# Status codes worth retrying: rate limited, or the server is briefly unavailable
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 units a second, holding up to burst_seconds' worth.
+
+    Providers enforce per-minute limits over shorter windows, so spending a
+    minute's worth at once would get rejected; a small burst smooths the rate.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 1.0):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken; a request larger than the bucket waits for a full one."""
+        self.refill(now)
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float, now: float):
+        # May go below zero when a call turns out to use more tokens than estimated
+        self.refill(now)
+        self.level -= amount
+
+
+class _Endpoint:
+    """Limits and waiting calls of one endpoint."""
+
+    def __init__(self, rpm: Optional[float], tpm: Optional[float]):
+        self.limits = (rpm, tpm)
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.waiting: List[Tuple[int, int]] = [] # Heap of (priority, ticket)
+        self.blocked_until = 0.0
+
+    def delay(self, tokens: int, now: float) -> float:
+        return max(self.blocked_until - now,
+                   self.requests.delay(1, now) if self.requests else 0.0,
+                   self.tokens.delay(tokens, now) if self.tokens else 0.0)
+
+    def take(self, tokens: int, now: float):
+        if self.requests:
+            self.requests.take(1, now)
+        if self.tokens:
+            self.tokens.take(tokens, now)
+
+
+class SchedulerStats:
+    """Thread-safe record of one run's scheduled calls, by role."""
+
+    def __init__(self):
+        self.calls: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, role: str, queued: float, retries: int = 0, rate_limited: int = 0, coalesced: bool = False):
+        with self._lock:
+            self.calls.setdefault(role, []).append(
+                {"queued": queued, "retries": retries, "rate_limited": rate_limited, "coalesced": coalesced})
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = {role: list(role_calls) for role, role_calls in self.calls.items()}
+        every_call = [call for role_calls in calls.values() for call in role_calls]
+        return {"total": self._summarize(every_call),
+                "roles": {role: self._summarize(role_calls) for role, role_calls in sorted(calls.items())}}
+
+    @staticmethod
+    def _summarize(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        queued = sorted(call["queued"] for call in calls)
+        return {
+            "calls": len(calls),
+            "coalesced": sum(call["coalesced"] for call in calls),
+            "retries": sum(call["retries"] for call in calls),
+            "rate_limited": sum(call["rate_limited"] for call in calls),
+            "queueing_delay": {
+                "total": round(sum(queued), 3),
+                "mean": round(statistics.fmean(queued), 3) if queued else 0.0,
+                "p95": round(queued[min(len(queued) - 1, int(0.95 * len(queued)))], 3) if queued else 0.0,
+                "max": round(queued[-1], 3) if queued else 0.0,
+            },
+        }
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """The Retry-After of an HTTP error response, in seconds, if the server sent one."""
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None # An HTTP date, fall back to the backoff
+
+
+class RequestScheduler:
+    """Process-wide gate every scheduled model call waits at for its turn (see module docstring)."""
+
+    _instance: Optional["RequestScheduler"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._endpoints: Dict[str, _Endpoint] = {}
+        self._tickets = itertools.count()
+        self._in_flight: Dict[str, Future] = {}
+
+    @classmethod
+    def get(cls) -> "RequestScheduler":
+        # One scheduler per process, so that concurrent runs share the endpoints' limits
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = RequestScheduler()
+            return cls._instance
+
+    def configure(self, endpoint: str, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        """Set the requests and tokens per minute allowed to an endpoint (None: unlimited)."""
+        with self._condition:
+            current = self._endpoints.get(endpoint)
+            if current is None:
+                self._endpoints[endpoint] = _Endpoint(rpm, tpm)
+            elif current.limits != (rpm, tpm):
+                # The latest run's limits apply, calls already waiting keep their place
+                updated = _Endpoint(rpm, tpm)
+                updated.waiting, updated.blocked_until = current.waiting, current.blocked_until
+                self._endpoints[endpoint] = updated
+                self._condition.notify_all()
+
+    def acquire(self, endpoint: str, priority: int, tokens: int) -> float:
+        """Wait until the call is first in line and the endpoint's limits allow it; returns the seconds waited."""
+        started = time.monotonic()
+        with self._condition:
+            state = self._endpoints.setdefault(endpoint, _Endpoint(None, None))
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(state.waiting, ticket)
+            while True:
+                state = self._endpoints[endpoint] # configure() may have replaced it
+                now = time.monotonic()
+                if state.waiting[0] == ticket:
+                    delay = state.delay(tokens, now)
+                    if delay <= 0:
+                        heapq.heappop(state.waiting)
+                        state.take(tokens, now)
+                        # The next call in line can check the limits now
+                        self._condition.notify_all()
+                        return now - started
+                    self._condition.wait(delay)
+                else:
+                    self._condition.wait()
+
+    def settle(self, endpoint: str, tokens: int):
+        """Charge (or refund, when negative) the difference between a call's actual and estimated tokens."""
+        with self._condition:
+            state = self._endpoints[endpoint]
+            if state.tokens:
+                state.tokens.take(tokens, time.monotonic())
+
+    def hold(self, endpoint: str, seconds: float):
+        """Hold back every call to an endpoint for the given number of seconds."""
+        with self._condition:
+            state = self._endpoints[endpoint]
+            state.blocked_until = max(state.blocked_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+    def call(self, endpoint: str, key: str, priority: int, tokens: int, send: Callable[[], Tuple[Any, int]],
+             record: Callable[[Dict[str, Any]], None], max_retries: int = DEFAULT_MAX_RETRIES) -> Any:
+        """Send a call when its turn comes, retrying transient errors; identical calls in flight share one send.
+
+        send() returns the response and the tokens actually used. Whether the
+        call succeeds or not, record() gets its queueing delay, retries, 429s and
+        whether it was coalesced into an identical call.
+        """
+        with self._condition:
+            leader = self._in_flight.get(key)
+            if leader is None:
+                future = self._in_flight[key] = Future()
+        if leader is not None:
+            started = time.monotonic()
+            try:
+                return leader.result()
+            finally:
+                record({"queued": time.monotonic() - started, "retries": 0, "rate_limited": 0, "coalesced": True})
+
+        stats = {"queued": 0.0, "retries": 0, "rate_limited": 0, "coalesced": False}
+        try:
+            while True:
+                stats["queued"] += self.acquire(endpoint, priority, tokens)
+                try:
+                    response, used = send()
+                except Exception as e:
+                    status = getattr(e, "status_code", None)
+                    if status not in RETRY_STATUS_CODES or stats["retries"] >= max_retries:
+                        raise
+                    stats["retries"] += 1
+                    stats["rate_limited"] += status == 429
+                    backoff = random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** stats["retries"]))
+                    self.hold(endpoint, max(backoff, retry_after(e) or 0.0))
+                    continue
+                self.settle(endpoint, used - tokens)
+                future.set_result(response)
+                return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._condition:
+                del self._in_flight[key]
+            record(stats)
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Rough prompt size (4 characters per token), charged before the call and settled after it."""
+    return len(json.dumps(messages, ensure_ascii=False, default=str)) // 4
+
+
+class ScheduledModel(ModelWrapper):
+    """Model wrapper that sends every call of one role through the shared RequestScheduler."""
+
+    def __init__(self, model: Model, role: str, endpoint: str, stats: SchedulerStats,
+                 max_retries: int = DEFAULT_MAX_RETRIES, scheduler: Optional[RequestScheduler] = None):
+        super().__init__(model)
+        self.role = role
+        self.endpoint = endpoint
+        self.stats = stats
+        self.max_retries = max_retries
+        self.scheduler = scheduler or RequestScheduler.get()
+
+    def __call__(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        def send() -> Tuple[ChatMessage, int]:
+            message = self.wrapped_model(
+                messages,
+                stop_sequences=stop_sequences,
+                grammar=grammar,
+                tools_to_call_from=tools_to_call_from,
+                **kwargs,
+            )
+            # Read from the response: the client is shared by every role and thread
+            counts = call_usage(self.wrapped_model, message)
+            return (message, counts), (counts[0] or 0) + (counts[1] or 0)
+
+        calls = []
+
+        def record(call: Dict[str, Any]):
+            calls.append(call)
+            self.stats.record(self.role, **call)
+
+        key = self.endpoint + cache_key(self.wrapped_model, messages, stop_sequences, grammar, tools_to_call_from,
+                                        **kwargs)
+        message, counts = self.scheduler.call(self.endpoint, key, ROLE_PRIORITIES.get(self.role, 0),
+                                              estimate_tokens(messages), send, record, self.max_retries)
+        # A coalesced call spent nothing of its own
+        self.last_input_token_count, self.last_output_token_count = (0, 0) if calls[0]["coalesced"] else counts
+        return message
@@ -0,0 +1,122 @@
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from smolagents import Model, Tool
+from smolagents.models import ChatMessage
+
+
+def call_usage(model: Model, message: ChatMessage) -> Tuple[Optional[int], Optional[int]]:
+    """Input and output tokens of the call to model that returned message.
+
+    A plain model's token counters are shared by every thread calling it, so
+    the usage the API sent with the response is used when there is one.
+    """
+    if not isinstance(model, ModelWrapper):
+        usage = getattr(message.raw, "usage", None)
+        if usage is not None:
+            return usage.prompt_tokens, usage.completion_tokens
+    return model.last_input_token_count, model.last_output_token_count
+
+
+class ModelWrapper(Model):
+    """Base class for models that add behaviour around another smolagents model.
+
+    Agents only need `__call__` plus the token counters; every other attribute
+    (model_id, kwargs, ...) is delegated to the wrapped model.
+    """
+
+    def __init__(self, model: Model):
+        # Model.__init__ is not called: the attributes it sets (kwargs, ...) would hide the wrapped model's
+        self.wrapped_model = model
+        self._usage = threading.local()
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes not found on the wrapper itself
+        if name in ("wrapped_model", "_usage"):
+            raise AttributeError(name)
+        return getattr(self.wrapped_model, name)
+
+    # The token counters are kept per thread: concurrent agents share wrappers, and each reads back the
+    # counts of its own call
+    @property
+    def last_input_token_count(self) -> Optional[int]:
+        return getattr(self._usage, "input_tokens", None)
+
+    @last_input_token_count.setter
+    def last_input_token_count(self, value: Optional[int]):
+        self._usage.input_tokens = value
+
+    @property
+    def last_output_token_count(self) -> Optional[int]:
+        return getattr(self._usage, "output_tokens", None)
+
+    @last_output_token_count.setter
+    def last_output_token_count(self, value: Optional[int]):
+        self._usage.output_tokens = value
+
+    def call_wrapped(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        """Call the wrapped model and mirror its token counters."""
+        message = self.wrapped_model(
+            messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            **kwargs,
+        )
+        self.last_input_token_count, self.last_output_token_count = call_usage(self.wrapped_model, message)
+        return message
+
+    def __call__(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        return self.call_wrapped(
+            messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            **kwargs,
+        )
+
+
+class TokenCounter(ModelWrapper):
+    """Model wrapper that adds up the calls and tokens of every call made through it."""
+
+    def __init__(self, model: Model):
+        super().__init__(model)
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def __call__(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        message = self.call_wrapped(
+            messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            **kwargs,
+        )
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += self.last_input_token_count or 0
+            self.output_tokens += self.last_output_token_count or 0
+        return message